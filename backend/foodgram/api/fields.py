@@ -0,0 +1,69 @@
+import binascii
+import uuid
+from base64 import b64decode
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+# base64 characters decoded per step, a multiple of 4
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+
+    def __del__(self):
+        # the storage may have moved the file away already; close()
+        # tolerates that, the tempfile finalizer does not
+        self.close()
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """
+    Image sent as a base64 data URL. The payload is decoded chunk by
+    chunk straight into a temporary file, so the decoded image is never
+    held in memory, and a payload over RECIPE_IMAGE_MAX_SIZE is refused
+    before any of it is decoded.
+    """
+    default_error_messages = {
+        'too_large': 'Картинка больше {max_size} байт',
+        'invalid_base64': 'Картинка должна быть в формате base64',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            data = self.decode(data)
+        elif isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        separator = data.find(';base64,')
+        if separator == -1:
+            self.fail('invalid_base64')
+        header = data[:separator]
+        start = separator + len(';base64,')
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if (len(data) - start) // 4 * 3 > max_size:
+            self.fail('too_large', max_size=max_size)
+        extension = header.split('/')[-1]
+        file = DecodedImageFile(
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=header[len('data:'):],
+            size=0,
+            charset=None,
+        )
+        try:
+            # slices of the payload, never a copy of all of it
+            for position in range(start, len(data), DECODE_CHUNK_SIZE):
+                file.write(b64decode(
+                    data[position:position + DECODE_CHUNK_SIZE],
+                    validate=True,
+                ))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
@@ -1,12 +1,133 @@
-from django_filters.filters import AllValuesMultipleFilter
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, When
+from django_filters.filters import (
+    BaseInFilter,
+    CharFilter,
+    ChoiceFilter,
+    MultipleChoiceFilter,
+    NumberFilter,
+)
 from django_filters.rest_framework import FilterSet
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Recipe
+from recipes.cache import TAGS_VERSION_KEY, get_version
+from recipes.fulltext import search_recipes
+from recipes.pantry import pantry_index
+from recipes.models import Recipe, Tag
+
+
+def get_tag_ids():
+    """
+    Tag ids by slug, cached until a tag changes. The tag table is tiny
+    and read by every filtered recipe list.
+    """
+    key = f'tags:ids:{get_version(TAGS_VERSION_KEY)}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, timeout=None)
+    return tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class TagSlugFilter(MultipleChoiceFilter):
+    """
+    Recipes having any of the given tags. The slugs are validated and
+    resolved against the cached tag ids, and the recipes are matched with
+    a semi-join (id IN (...)), so a recipe with several of the tags is
+    returned once without DISTINCT and page counts stay right.
+    """
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = get_tag_ids()
+        return qs.filter(id__in=Recipe.tags.through.objects.filter(
+            tag_id__in=[tag_ids[slug] for slug in value if slug in tag_ids]
+        ).values('recipe_id'))
+
+
+class NumberInFilter(BaseInFilter, NumberFilter):
+    pass
+
+
+def first_in_queryset(queryset, recipe_ids, limit):
+    """
+    The first ``limit`` of ``recipe_ids`` that ``queryset`` keeps, in
+    order. They are checked in doubling batches, so a selective filter
+    costs a few queries rather than one per batch.
+    """
+    if not queryset.query.has_filters():
+        return recipe_ids[:limit]
+    found = []
+    start, size = 0, limit
+    while start < len(recipe_ids) and len(found) < limit:
+        batch = recipe_ids[start:start + size]
+        kept = set(queryset.filter(id__in=batch).order_by().values_list(
+            'id', flat=True
+        ))
+        found += [recipe_id for recipe_id in batch if recipe_id in kept]
+        start += size
+        size *= 2
+    return found[:limit]
 
 
 class RecipeFilter(FilterSet):
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagSlugFilter(choices=tag_choices)
+    search = CharFilter(method='filter_search')
+    pantry = NumberInFilter(method='filter_pantry')
+    missing = NumberFilter(method='filter_missing', min_value=0)
+    ordering = ChoiceFilter(
+        choices=(('trending', 'trending'),),
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
         fields = ('author', )
+
+    def filter_search(self, queryset, name, value):
+        """Full-text search over names and texts, best matches first."""
+        return search_recipes(queryset, value)
+
+    def filter_pantry(self, queryset, name, value):
+        """
+        Recipes that can be cooked from the given ingredients, the best
+        covered first; ``missing`` caps the ingredients to buy. The
+        results are capped after the other filters, which come first.
+        """
+        missing = self.form.cleaned_data.get('missing')
+        matches = pantry_index.match(
+            [int(ingredient_id) for ingredient_id in value],
+            max_missing=None if missing is None else int(missing),
+        )
+        recipe_ids = first_in_queryset(
+            queryset,
+            [recipe_id for recipe_id, _, _ in matches],
+            settings.PANTRY_MAX_RESULTS,
+        )
+        return queryset.filter(id__in=recipe_ids).order_by(Case(
+            *[
+                When(id=recipe_id, then=position)
+                for position, recipe_id in enumerate(recipe_ids)
+            ],
+            output_field=IntegerField(),
+        ))
+
+    def filter_missing(self, queryset, name, value):
+        # applied by filter_pantry
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        # keyset pages would be cut by scores that keep moving, and the
+        # cursor paginator imposes its own order anyway
+        if self.data.get('pagination') == 'cursor':
+            raise ValidationError(
+                {'ordering': 'Не сочетается с pagination=cursor'}
+            )
+        # the trending score index serves this order
+        return queryset.order_by('-trending_score', '-id')
@@ -0,0 +1,139 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache import (
+    RECIPES_VERSION_KEY,
+    get_recipe_version,
+    get_version,
+)
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+
+class ConditionalGetMixin:
+    """
+    Answers list/retrieve with 304 Not Modified, before anything is
+    serialized, when the client already has the current version.
+    Viewsets return their ETag and Last-Modified (unix time) from
+    ``get_validators``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        etag = quote_etag(etag)
+        last_modified = int(last_modified)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class CachedRecipeMixin:
+    """
+    Serves recipe list/retrieve from a cache shared by all viewers.
+    Entries are keyed on the recipe version counters, which are bumped
+    from recipes.signals.
+    """
+    uncached_params = ()
+    shared_payload = False
+
+    def list(self, request, *args, **kwargs):
+        if any(param in request.query_params
+               for param in self.uncached_params):
+            return super().list(request, *args, **kwargs)
+        params = sorted(
+            (key, sorted(request.query_params.getlist(key)))
+            for key in request.query_params
+        )
+        key = 'recipes:list:{}:{}'.format(
+            '-'.join(
+                str(get_version(version_key))
+                for version_key in self.get_list_version_keys()
+            ),
+            md5(repr(params).encode()).hexdigest(),
+        )
+        return self.cached_response(key, super().list, request,
+                                    *args, **kwargs)
+
+    def get_list_version_keys(self):
+        """Version counters that the cached list pages are keyed on."""
+        return (RECIPES_VERSION_KEY,)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        key = 'recipes:detail:{}:{}'.format(pk, get_recipe_version(pk))
+        return self.cached_response(key, super().retrieve, request,
+                                    *args, **kwargs)
+
+    def cached_response(self, key, handler, request, *args, **kwargs):
+        """
+        Serves the viewer independent payload from the cache and puts
+        the current user's flags on top of it. The payload holds absolute
+        image and page URLs, so it is cached per scheme and host.
+        """
+        origin = request.build_absolute_uri('/')
+        key = f'{key}:{md5(origin.encode()).hexdigest()}'
+        data = cache.get(key)
+        if data is None:
+            self.shared_payload = True
+            response = handler(request, *args, **kwargs)
+            self.shared_payload = False
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+        recipes = data['results'] if 'results' in data else [data]
+        self.apply_viewer_flags(recipes)
+        return Response(data)
+
+    def apply_viewer_flags(self, recipes):
+        user = self.request.user
+        if user.is_anonymous or not recipes:
+            return
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        author_ids = [recipe['author']['id'] for recipe in recipes]
+        favorited = set(Favorite.objects.filter(
+            user=user,
+            recipe__in=recipe_ids
+        ).values_list('recipe', flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=user,
+            recipe__in=recipe_ids
+        ).values_list('recipe', flat=True))
+        subscribed = set(Subscription.objects.filter(
+            follower=user,
+            follow__in=author_ids
+        ).values_list('follow', flat=True))
+        for recipe in recipes:
+            recipe['is_favorited'] = recipe['id'] in favorited
+            recipe['is_in_shopping_cart'] = recipe['id'] in in_cart
+            recipe['author']['is_subscribed'] = (
+                recipe['author']['id'] in subscribed
+            )
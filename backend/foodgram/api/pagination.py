@@ -1,5 +1,43 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.utils.dateparse import parse_datetime
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 
 
 class PageNumberLimitPagination(pagination.PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class RecipeCursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination for the recipe feed: pages are selected with
+    WHERE pub_date < cursor instead of OFFSET and no COUNT(*) is run.
+    The id breaks ties between recipes published at the same moment.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+
+def encode_position(position):
+    """Opaque cursor for a (pub_date, id) keyset position."""
+    pub_date, recipe_id = position
+    return urlsafe_b64encode(
+        f'{pub_date.isoformat()} {recipe_id}'.encode()
+    ).decode()
+
+
+def decode_position(cursor):
+    if cursor is None:
+        return None
+    try:
+        pub_date, recipe_id = urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split(' ')
+        position = parse_datetime(pub_date), int(recipe_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound('Invalid cursor')
+    if position[0] is None:
+        raise NotFound('Invalid cursor')
+    return position
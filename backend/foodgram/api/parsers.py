@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body is too large.'
+    default_code = 'request_too_large'
+
+
+class LimitedJSONParser(JSONParser):
+    """Refuses bodies over RECIPE_MAX_BODY_SIZE before reading them."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > settings.RECIPE_MAX_BODY_SIZE:
+                raise RequestEntityTooLarge()
+        return super().parse(stream, media_type, parser_context)
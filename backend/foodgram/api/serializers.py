@@ -1,11 +1,16 @@
-from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
 from rest_framework import serializers
-from drf_base64.fields import Base64ImageField
+
+from api.fields import StreamingBase64ImageField
 
 from users.serializers import UserSerializer
 from users.models import CustomUser
 
+from recipes import feed, images, pantry, shopping_list
+from recipes.cache import bump_recipe_version
 from recipes.models import (
     Tag,
     Ingredient,
@@ -17,6 +22,21 @@ from recipes.models import (
 )
 
 
+def image_variant_urls(recipe, request):
+    """URLs of the resized copies of the recipe's current image."""
+    variants = recipe.image_variants
+    if not recipe.image or variants.get('source') != recipe.image.name:
+        return {}
+    urls = {
+        name: default_storage.url(variants[name]) for name in images.VARIANTS
+    }
+    if request is not None:
+        urls = {
+            name: request.build_absolute_uri(url) for name, url in urls.items()
+        }
+    return urls
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -67,18 +87,41 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     author = UserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = StreamingBase64ImageField(max_length=None, use_url=True)
     ingredients = RecipeIngredientSerializerCreate(many=True)
 
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        # the counter and trending columns change without invalidating
+        # the cached payloads, so they are not part of them
+        fields = [
+            'id',
+            'tags',
+            'author',
+            'image',
+            'ingredients',
+            'image_variants',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'text',
+            'cooking_time',
+            'pub_date',
+        ]
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj, self.context.get('request'))
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         current_user = self.context.get('request').user
+        if current_user.is_anonymous:
+            return False
         current_recipe = obj
         is_favorite = Favorite.objects.filter(
             user=current_user,
@@ -87,7 +130,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         return is_favorite
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         current_user = self.context.get('request').user
+        if current_user.is_anonymous:
+            return False
         current_recipe = obj
         in_cart = ShoppingCart.objects.filter(
             user=current_user,
@@ -95,92 +142,155 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
         return in_cart
 
+    def to_representation(self, instance):
+        if not getattr(instance, '_prefetched_objects_cache', None):
+            prefetch_related_objects(
+                [instance],
+                'tags',
+                Prefetch(
+                    'recipeingredient_set',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+            )
+        return RecipeReadSerializer(instance, context=self.context).data
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
-        recipe.tags.set(tags)
-
-        objs = []
-        for ingredient in ingredients:
-            amount = ingredient.get('amount')
-            ingredient_instance = get_object_or_404(
-                Ingredient,
-                pk=ingredient.get('id')
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=recipe, tag=tag) for tag in tags
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=item['ingredient'],
+                amount=item['amount']
             )
-            objs.append(
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=ingredient_instance,
-                    amount=amount
-                )
-            )
-        RecipeIngredient.objects.bulk_create(objs)
-
-        recipe.save()
+            for item in ingredients
+        ])
+        if recipe.image:
+            images.schedule_variants(recipe.id)
+        feed.publish(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        recipe = Recipe.objects.filter(id=instance.id)
-        recipe.update(**validated_data)
-        ingredients_instance = [
-            ingredient for ingredient in instance.ingredients.all()
-        ]
-        for item in ingredients:
-            amount = item['amount']
-            ingredient_id = item['id']
-            if RecipeIngredient.objects.filter(
-                    id=ingredient_id,
-                    amount=amount
-            ).exists():
-                ingredients_instance.remove(
-                    RecipeIngredient.objects.get(
-                        id=ingredient_id,
-                        amount=amount
-                    ).ingredient)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # only the submitted columns: the counters and image variants
+        # are updated concurrently with F() expressions
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        if validated_data.get('image'):
+            images.schedule_variants(instance.id)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            current_tags = set(instance.tags.values_list('id', flat=True))
+            if current_tags != {tag.id for tag in tags}:
+                instance.tags.set(tags)
+        return instance
+
+    def update_ingredients(self, instance, ingredients):
+        """
+        Applies the submitted ingredients as a delta against the stored
+        ones: one bulk insert, one bulk update and one delete at most.
+        """
+        current = {}
+        to_delete = []
+        for row in instance.recipeingredient_set.select_for_update():
+            if row.ingredient_id in current:
+                to_delete.append(row.id)
             else:
-                RecipeIngredient.objects.get_or_create(
+                current[row.ingredient_id] = row
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in current.items()
+        }
+        to_create, to_update = [], []
+        for item in ingredients:
+            row = current.pop(item['ingredient'].id, None)
+            if row is None:
+                to_create.append(RecipeIngredient(
                     recipe=instance,
-                    ingredient=get_object_or_404(Ingredient, id=ingredient_id),
-                    amount=amount
-                )
-        if validated_data.get('image') is not None:
-            instance.image = validated_data.get('image', instance.image)
-        instance.ingredients.remove(*ingredients_instance)
-        instance.tags.set(tags)
-        return instance
+                    ingredient=item['ingredient'],
+                    amount=item['amount']
+                ))
+            elif row.amount != item['amount']:
+                row.amount = item['amount']
+                to_update.append(row)
+        to_delete += [row.id for row in current.values()]
+        if not (to_create or to_update or to_delete):
+            return
+        RecipeIngredient.objects.bulk_create(to_create)
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        # the bulk writes send no signals
+        bump_recipe_version(instance.id)
+        pantry.recipe_changed(instance.id)
+        shopping_list.recipe_changed(
+            instance.id,
+            old_amounts,
+            {item['ingredient'].id: item['amount'] for item in ingredients},
+        )
 
     def validate(self, attrs):
-        if len(attrs["tags"]) == 0:
+        if "tags" in attrs:
+            self.validate_tag_list(attrs["tags"])
+        if "ingredients" in attrs:
+            self.validate_ingredient_list(attrs["ingredients"])
+        if "cooking_time" in attrs and attrs["cooking_time"] <= 0:
+            raise serializers.ValidationError(
+                "Укажите время приготовления"
+            )
+        return super().validate(attrs)
+
+    def validate_tag_list(self, tags):
+        if len(tags) == 0:
             raise serializers.ValidationError("Не выбранор ни одного тега")
-        if len(attrs["tags"]) != len(set(attrs["tags"])):
+        if len(tags) != len(set(tags)):
             raise serializers.ValidationError("Теги должны быть уникальны")
-        if len(attrs["ingredientinrecipe_set"]) == 0:
+
+    def validate_ingredient_list(self, ingredients):
+        if len(ingredients) == 0:
             raise serializers.ValidationError(
                 "Не выбрано ни одного ингредиента"
             )
-        ingredients = attrs["ingredientinrecipe_set"]
-        if len(ingredients) != len(set(obj["ingredient"] for obj in ingredients)):
+        if len(ingredients) != len(set(obj["id"] for obj in ingredients)):
             raise serializers.ValidationError("Ингредиенты должны быть уникальны")
         if any(obj["amount"] <= 0 for obj in ingredients):
             raise serializers.ValidationError(
                 "Нет количества ингредиентов"
             )
-        if attrs["cooking_time"] <= 0:
+        found = Ingredient.objects.in_bulk(
+            [obj["id"] for obj in ingredients]
+        )
+        missing = [obj["id"] for obj in ingredients if obj["id"] not in found]
+        if missing:
             raise serializers.ValidationError(
-                "Укажите время приготовления"
+                "Ингредиенты не найдены: "
+                + ", ".join(str(pk) for pk in missing)
             )
-        return super().validate(attrs)
+        for obj in ingredients:
+            obj["ingredient"] = found[obj["id"]]
 
 
 class SubcriptionRecipeSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_variants', 'cooking_time']
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj, self.context.get('request'))
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
@@ -199,6 +309,11 @@ class RecipeReadSerializer(RecipeSerializer):
         many=True,
     )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return serializers.ModelSerializer.to_representation(self, instance)
+
 
 class SubscribeUserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -206,7 +321,7 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
         source='recipe_user',
         many=True
     )
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = CustomUser
@@ -222,18 +337,13 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
-        current_user = self.context.get('current_user')
-        current_recipe_author = obj
-        is_subscribed = Subscription.objects.filter(
-            follow=current_recipe_author,
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        current_user = self.context['request'].user
+        return Subscription.objects.filter(
+            follow=obj,
             follower=current_user
         ).exists()
-        return is_subscribed
-
-    def get_recipes_count(self, obj):
-        current_recipe_author = obj
-        amount = Recipe.objects.filter(author=current_recipe_author).count()
-        return amount
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
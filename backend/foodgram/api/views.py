@@ -1,16 +1,55 @@
+import csv
+import json
+
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+)
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.http.response import HttpResponse
+from django.http.response import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import viewsets, status
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes,
+    renderer_classes,
+)
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
 
 from api.permissions import OwnerAdminOrReadOnly
 from api.filters import RecipeFilter
+from api.mixins import CachedRecipeMixin, ConditionalGetMixin
+from api.pagination import (
+    RecipeCursorPagination,
+    decode_position,
+    encode_position,
+)
+from api.parsers import LimitedJSONParser
+from api.renderers import CSVRenderer, PlainTextRenderer
 
+from recipes.cache import (
+    RECIPE_VERSION_KEY,
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    TRENDING_VERSION_KEY,
+    USER_VERSION_KEY,
+    catalog_validators,
+    get_modified,
+    get_version,
+)
 from recipes.models import (
     Tag,
     Ingredient,
@@ -18,7 +57,11 @@ from recipes.models import (
     Recipe,
     Favorite,
     ShoppingCart,
+    ShoppingListItem,
+    Subscription,
 )
+from recipes import feed, trending
+from recipes.search import fuzzy_search, ingredient_index
 
 from .serializers import (
     TagSerializer,
@@ -33,56 +76,147 @@ from .serializers import (
 from users.models import CustomUser
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     http_method_names = ['get']
     permission_classes = (AllowAny,)
     pagination_class = None
+    version_key = TAGS_VERSION_KEY
 
+    def get_validators(self, request, *args, **kwargs):
+        return catalog_validators('tags', self.version_key)
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny, )
+    version_key = INGREDIENTS_VERSION_KEY
 
-    def get_queryset(self):
-        queryset = Ingredient.objects.all()
+    def get_validators(self, request, *args, **kwargs):
+        return catalog_validators('ingredients', self.version_key)
+
+    def filter_queryset(self, queryset):
         name = self.request.query_params.get("name")
-        if name is not None:
-            queryset = queryset.filter(name__icontains=name)
-        return queryset
+        if name is None or self.action != 'list':
+            return super().filter_queryset(queryset)
+        try:
+            limit = int(self.request.query_params.get(
+                "limit", settings.INGREDIENT_SEARCH_LIMIT
+            ))
+        except ValueError:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        limit = min(max(limit, 1), settings.INGREDIENT_SEARCH_MAX_LIMIT)
+        if self.request.query_params.get("fuzzy") == '1':
+            return fuzzy_search(name, limit)
+        return ingredient_index.search(name, limit)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(
+    ConditionalGetMixin,
+    CachedRecipeMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        ),
+    )
     serializer_class = RecipeSerializer
     permission_classes = (OwnerAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (LimitedJSONParser, FormParser, MultiPartParser)
+    lookup_value_regex = r'\d+'
+    # queries per action regardless of the page size, enforced by
+    # tests/test_query_budget.py. list: count + page + tags +
+    # ingredients, plus three viewer flag lookups; feed: stored and
+    # fanned-in timeline + recipes + tags + ingredients; similar: the
+    # recipe + its neighbours
+    query_budget = {
+        'list': 7,
+        'retrieve': 6,
+        'followed_feed': 5,
+        'similar': 2,
+    }
+    # filters that depend on the viewer can not be served from the
+    # shared cache
+    uncached_params = ('is_favorited', 'is_in_shopping_cart')
 
     def get_queryset(self):
-        queryset = Recipe.objects.all()
+        user = self.request.user.id
+        if self.shared_payload:
+            queryset = super().get_queryset().annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(False, output_field=BooleanField()),
+            )
+        else:
+            queryset = super().get_queryset().annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk')
+                )),
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    follower=user,
+                    follow=OuterRef('author')
+                )),
+            )
         is_favorited = self.request.query_params.get("is_favorited")
         is_in_shopping_cart = self.request.query_params.get(
             "is_in_shopping_cart"
         )
-        all_cart = ShoppingCart.objects.filter(user=self.request.user.id)
-        all_favorite = Favorite.objects.filter(user=self.request.user.id)
 
         if is_favorited == '1':
-            queryset = queryset.filter(recipe_favorite__in=all_favorite)
+            queryset = queryset.filter(is_favorited=True)
         if is_favorited == '0':
-            queryset = queryset.exclude(recipe_favorite__in=all_favorite)
+            queryset = queryset.filter(is_favorited=False)
 
         if is_in_shopping_cart == '1':
-            queryset = queryset.filter(shoppinglist__in=all_cart)
+            queryset = queryset.filter(is_in_shopping_cart=True)
         if is_in_shopping_cart == '0':
-            queryset = queryset.exclude(shoppinglist__in=all_cart)
+            queryset = queryset.filter(is_in_shopping_cart=False)
 
         return queryset.all()
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor switches the feed to keyset pagination;
+        # the next/previous links keep the parameter
+        if self.request.query_params.get('pagination') == 'cursor':
+            self.pagination_class = RecipeCursorPagination
+        return super().paginator
+
+    def get_validators(self, request, *args, **kwargs):
+        # the payload depends on the viewer's favorites, cart and
+        # subscriptions as well as on the recipes themselves
+        if self.detail:
+            keys = (RECIPE_VERSION_KEY.format(kwargs[self.lookup_field]),)
+        else:
+            keys = self.get_list_version_keys()
+        etag = 'recipes-' + '-'.join(str(get_version(key)) for key in keys)
+        last_modified = max(get_modified(key) for key in keys)
+        if request.user.is_authenticated:
+            user_key = USER_VERSION_KEY.format(request.user.id)
+            etag += f'-{request.user.id}-{get_version(user_key)}'
+            last_modified = max(last_modified, get_modified(user_key))
+        return etag, last_modified
+
+    def get_list_version_keys(self):
+        keys = super().get_list_version_keys()
+        # the trending order moves with every favorite
+        if self.request.query_params.get('ordering') == 'trending':
+            keys += (TRENDING_VERSION_KEY,)
+        return keys
+
     @action(
         methods=["POST", "DELETE"],
         url_path='favorite',
@@ -105,7 +239,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     f'{user}', status=status.HTTP_400_BAD_REQUEST
                 )
             serializer.is_valid(raise_exception=True)
-            serializer.save(recipe=recipe, user=user)
+            with transaction.atomic():
+                serializer.save(recipe=recipe, user=user)
+                trending.record(recipe.id, 1)
             serializer = SubcriptionRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -116,7 +252,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         favorite = get_object_or_404(Favorite, user=user, recipe__id=pk)
-        favorite.delete()
+        with transaction.atomic():
+            favorite.delete()
+            trending.record(recipe.id, -1)
         return Response(
             f'Recipe -- {recipe} -- removed from favorites for user: '
             f'{user}', status=status.HTTP_204_NO_CONTENT
@@ -144,7 +282,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     f'{user}', status=status.HTTP_400_BAD_REQUEST
                 )
             serializer.is_valid(raise_exception=True)
-            serializer.save(recipe=recipe, user=user)
+            # the totals are updated by recipes.signals
+            with transaction.atomic():
+                serializer.save(recipe=recipe, user=user)
             serializer = SubcriptionRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -161,39 +301,119 @@ class RecipeViewSet(viewsets.ModelViewSet):
             f'{user}', status=status.HTTP_204_NO_CONTENT
         )
 
+    @action(
+        methods=["GET"],
+        url_path='feed',
+        url_name='feed',
+        permission_classes=[IsAuthenticated],
+        detail=False
+    )
+    def followed_feed(self, request):
+        """
+        Recipes of the followed authors, newest first. Pages are keyset
+        paginated: ?cursor= comes from the previous page's next link.
+        """
+        try:
+            size = int(request.query_params.get(
+                'limit', settings.FEED_PAGE_SIZE
+            ))
+        except ValueError:
+            size = settings.FEED_PAGE_SIZE
+        size = min(max(size, 1), settings.FEED_MAX_PAGE_SIZE)
+        position = decode_position(request.query_params.get('cursor'))
+        rows, more = feed.page(request.user, position, size)
+        recipe_ids = [recipe_id for _, recipe_id in rows]
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True,
+        )
+        next_url = None
+        if more:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor',
+                encode_position(rows[-1]),
+            )
+        return Response({
+            'next': next_url,
+            'previous': None,
+            'results': serializer.data,
+        })
+
+    @action(
+        methods=["GET"],
+        url_path='similar',
+        url_name='similar',
+        detail=True
+    )
+    def similar(self, request, pk):
+        """Recipes favorited by the same users, precomputed offline."""
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score', '-id')[
+            :settings.RECOMMENDATION_NEIGHBOURS
+        ]
+        serializer = SubcriptionRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeSerializer
 
 
+class Echo:
+    """File-like object that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_lines(items, file_format):
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in items:
+            yield writer.writerow(
+                (item['name'], item['measurement_unit'], item['amount'])
+            )
+    elif file_format == 'json':
+        yield '['
+        for counter, item in enumerate(items):
+            yield (',' if counter else '') + json.dumps(
+                item, ensure_ascii=False
+            )
+        yield ']'
+    else:
+        for counter, item in enumerate(items, start=1):
+            yield (
+                f'{counter}) {item["name"]} - {item["amount"]} '
+                f'{item["measurement_unit"]}\n'
+            )
+
+
 @api_view(['GET', ])
 @permission_classes([IsAuthenticated])
+@renderer_classes([PlainTextRenderer, CSVRenderer, JSONRenderer])
 def download_shopping_cart(request):
-    user = request.user
-    shopping_list = user.shoppinglist.all()
-
-    buy_list = {}
-
-    for item in shopping_list:
-        recipe = item.recipe
-        ingredients = recipe.ingredients.all()
-        for ingredient in ingredients:
-            amount = RecipeIngredient.objects.get(
-                recipe=recipe,
-                ingredient=ingredient
-            ).amount
-            if buy_list.get(ingredient):
-                buy_list[ingredient] += amount
-            else:
-                buy_list[ingredient] = amount
-
-    result, counter = [], 0
-    for ing, am in buy_list.items():
-        counter += 1
-        line = f'{counter}) {ing.name} - {am} {ing.measurement_unit}\n'
-        result.append(line)
-
-    response = HttpResponse(result, content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename=shopping_list.txt'
+    file_format = request.accepted_renderer.format
+    items = ShoppingListItem.objects.filter(
+        user=request.user
+    ).values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by('name', 'measurement_unit')
+
+    response = StreamingHttpResponse(
+        shopping_list_lines(items.iterator(), file_format),
+        content_type=request.accepted_renderer.media_type,
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{file_format}'
+    )
     return response
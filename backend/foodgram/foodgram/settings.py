@@ -97,6 +97,34 @@ else:
     }
 
 
+# Cache
+# REQUIRED in production: every web worker and management command
+# (load_data, rebuild_*) must share one cache backend, set with
+# CACHE_BACKEND and CACHE_LOCATION (memcached, database, ...). The version
+# counters behind the recipe cache and the ETags live there. With the
+# process-local default, writes made in another process show up only
+# after RECIPE_CACHE_TIMEOUT (recipes) or INGREDIENT_INDEX_TTL (tags and
+# ingredients). `manage.py check --deploy` fails on a process-local
+# backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 5))
+
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # trigram lookups for the fuzzy ingredient search
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -150,6 +178,14 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = BASE_DIR.joinpath('media/')
 
+# Largest decoded recipe image, and the largest JSON body of a recipe
+# write (the image grows by a third in base64)
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 ** 2))
+RECIPE_MAX_BODY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 ** 2
+
+# Threads per worker process that render recipe image variants
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -164,6 +200,37 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Ingredient autocomplete, /api/ingredients/?name=...&limit=...
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+# Minimal trigram similarity of ?fuzzy=1 results without pg_trgm; on
+# PostgreSQL the pg_trgm.similarity_threshold setting (0.3) applies
+INGREDIENT_FUZZY_THRESHOLD = 0.3
+# Seconds before the in-process ingredient index is rebuilt, and the
+# tag and ingredient ETags change, even though no change reached them
+# through the cache
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 60))
+
+# Most recipes ranked by /api/recipes/?pantry=...
+PANTRY_MAX_RESULTS = 500
+
+# Followed-authors feed, /api/recipes/feed/: recipes of authors with
+# more followers than FEED_FANOUT_MAX_FOLLOWERS are read at request time
+# instead of being copied into every follower's timeline
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+# recipes of a newly followed author copied into the timeline
+FEED_BACKFILL = 100
+FEED_PAGE_SIZE = 10
+FEED_MAX_PAGE_SIZE = 100
+
+# Neighbours kept per recipe by build_recommendations, and served by
+# /api/recipes/<id>/similar/
+RECOMMENDATION_NEIGHBOURS = 20
+
+# A favorite counts half as much towards ?ordering=trending after this
+# many seconds
+TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE', 3 * 24 * 60 * 60))
+
 DJOSER = {
     "SERIALIZERS": {
         "user": "users.serializers.UserSerializer",
@@ -1,4 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
+
+from . import shopping_list
+from .fulltext import search_recipes
 from .models import (
     Recipe,
     RecipeIngredient,
@@ -10,16 +14,60 @@ from .models import (
 )
 
 
+class InputFilter(admin.SimpleListFilter):
+    """
+    A list filter typed into a text box instead of picked from a list of
+    every distinct value, which would scan the whole table on each page.
+    """
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (name, value)
+            for name, value in changelist.get_filters_params().items()
+            if name != self.parameter_name
+        ]
+        yield all_choice
+
+
+class AuthorFilter(InputFilter):
+    title = 'автору (email)'
+    parameter_name = 'author_email'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(author__email__iexact=self.value().strip())
+        return queryset
+
+
+class NameFilter(InputFilter):
+    title = 'названию'
+    parameter_name = 'name_starts'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(name__istartswith=self.value().strip())
+        return queryset
+
+
 class IngredientInRecipeInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 0
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    @admin.display(description="Количество добавлений в избранное")
+    @admin.display(
+        description="Количество добавлений в избранное",
+        ordering='favorites_count',
+    )
     def favorite_amount(self):
-        return Favorite.objects.filter(recipe=self.id).count()
+        return self.favorites_count
 
     @admin.display(description="Теги рецепта")
     def tags_line(self):
@@ -37,8 +85,33 @@ class RecipeAdmin(admin.ModelAdmin):
         IngredientInRecipeInline,
     )
 
-    list_filter = ('author', 'name', 'tags', )
-    search_fields = ('name', 'author__email', 'tags__name')
+    list_select_related = ('author',)
+    list_filter = (AuthorFilter, NameFilter, 'tags', )
+    search_fields = ('name', 'text', 'author__email')
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tags')
+
+    def save_related(self, request, form, formsets, change):
+        # the ingredient inline changes the carts' totals
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        with shopping_list.tracking_recipes([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        An author's email finds their recipes, anything else goes to the
+        full-text index instead of icontains scans over the joins.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if '@' in search_term:
+            return queryset.filter(author__email__iexact=search_term), False
+        return search_recipes(queryset, search_term), False
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
@@ -48,6 +121,28 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'recipe',
         'amount',
     )
+    list_select_related = ('ingredient', 'recipe')
+    autocomplete_fields = ('ingredient', 'recipe')
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change and 'recipe' in form.changed_data:
+            recipe_ids.append(form.initial['recipe'])
+        with shopping_list.tracking_recipes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with shopping_list.tracking_recipes([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    # the delete action, unlike the add, change and delete views, does
+    # not run in a transaction of its own
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipe_ids = queryset.values_list('recipe_id', flat=True).distinct()
+        with shopping_list.tracking_recipes(list(recipe_ids)):
+            super().delete_queryset(request, queryset)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -75,6 +170,9 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe',
         'user',
     )
+    list_select_related = ('recipe', 'user')
+    autocomplete_fields = ('recipe', 'user')
+    show_full_result_count = False
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -83,6 +181,9 @@ class FavoriteAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
 
 
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -91,6 +192,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'follow',
         'follower',
     )
+    list_select_related = ('follow', 'follower')
+    autocomplete_fields = ('follow', 'follower')
+    show_full_result_count = False
 
 
 admin.site.register(Recipe, RecipeAdmin)
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        post_migrate.connect(restore_search_triggers, sender=self)
+
+
+def restore_search_triggers(using, **kwargs):
+    from django.db import connections
+
+    from .fulltext import restore_sqlite_triggers
+
+    restore_sqlite_triggers(connections[using])
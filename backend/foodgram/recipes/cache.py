@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES_VERSION_KEY = 'recipes:version'
+RECIPE_VERSION_KEY = 'recipe:{}:version'
+TAGS_VERSION_KEY = 'tags:version'
+INGREDIENTS_VERSION_KEY = 'ingredients:version'
+USER_VERSION_KEY = 'user:{}:version'
+TRENDING_VERSION_KEY = 'trending:version'
+
+
+def get_version(key):
+    """
+    Current value of a version counter. A missing counter starts from
+    the current time, so a counter evicted from the cache never returns
+    to a value that older entries were stored under.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(key):
+    """Unix time of the last bump of a version counter."""
+    modified = cache.get(f'{key}:modified')
+    if modified is None:
+        cache.add(f'{key}:modified', time.time(), timeout=None)
+        modified = cache.get(f'{key}:modified')
+    return modified
+
+
+def bump_version(key):
+    """
+    Bumps a version counter once the current transaction commits, so
+    that no reader can cache the old data under the new version.
+    """
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    cache.set(f'{key}:modified', time.time(), timeout=None)
+
+
+def get_recipes_version():
+    return get_version(RECIPES_VERSION_KEY)
+
+
+def get_recipe_version(recipe_id):
+    return get_version(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+def bump_recipe_version(recipe_id=None):
+    """Invalidates cached recipe lists and, if given, one recipe."""
+    bump_version(RECIPES_VERSION_KEY)
+    if recipe_id is not None:
+        bump_version(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+def bump_recipe_versions(recipe_ids):
+    """Invalidates cached recipe lists and each of the given recipes."""
+    bump_version(RECIPES_VERSION_KEY)
+    for recipe_id in recipe_ids:
+        bump_version(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+def bump_user_version(user_id):
+    """Marks a change of the user's favorites, cart or subscriptions."""
+    bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def catalog_validators(prefix, key):
+    """
+    ETag and Last-Modified (unix time) of the tag or ingredient list.
+    Besides the version counter they move on every INGREDIENT_INDEX_TTL
+    seconds, the window in which the ingredient index picks up writes
+    from other processes, so a load_data run whose bump never reached
+    this process's cache is not answered 304 for longer than that.
+    """
+    window = max(settings.INGREDIENT_INDEX_TTL, 1)
+    period = int(time.time() // window)
+    return (
+        f'{prefix}-{get_version(key)}-{period}',
+        max(get_modified(key), period * window),
+    )
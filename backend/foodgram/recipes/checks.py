@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The version counters must be shared by every process."""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        'The default cache is local to each process.',
+        hint=(
+            'Set CACHE_BACKEND and CACHE_LOCATION to a cache shared by '
+            'all workers and management commands.'
+        ),
+        id='recipes.E001',
+    )]
@@ -0,0 +1,59 @@
+"""
+Denormalized counters: Recipe.favorites_count, CustomUser.recipes_count
+and CustomUser.followers_count. They are adjusted in place with F()
+expressions as rows come and go, and reconciled against the real row
+counts by the reconcile_counters command.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import CustomUser
+
+from .models import Favorite, Recipe, Subscription
+
+# (model, counter field, counted model, lookup from it to the model)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Subscription, 'follow'),
+)
+
+
+def adjust(model, pk, field, delta):
+    """Adds ``delta`` to a counter in one UPDATE, never going below 0."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(counted, lookup):
+    return Coalesce(
+        Subquery(
+            counted.objects.filter(
+                **{lookup: OuterRef('pk')}
+            ).order_by().values(lookup).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0,
+    )
+
+
+def reconcile(dry_run=False):
+    """
+    Rewrites the counters that differ from the real row counts and
+    returns how many rows of each counter had drifted.
+    """
+    drift = {}
+    for model, field, counted, lookup in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=actual_count(counted, lookup)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+        drifted = list(drifted)
+        if drifted and not dry_run:
+            model.objects.filter(pk__in=drifted).update(
+                **{field: actual_count(counted, lookup)}
+            )
+        drift[f'{model._meta.model_name}.{field}'] = len(drifted)
+    return drift
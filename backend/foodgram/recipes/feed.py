@@ -0,0 +1,120 @@
+"""
+Timeline of recipes from followed authors. A new recipe is copied into
+the FeedEntry rows of its author's followers (fan-out on write), so a
+page of the feed is one index range scan. Authors with more followers
+than FEED_FANOUT_MAX_FOLLOWERS are not copied; their recipes are read
+at request time and merged into the page (fan-out on read).
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from users.models import CustomUser
+
+from .models import FeedEntry, Recipe, Subscription
+
+
+def is_celebrity(author):
+    return author.followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def publish(recipe):
+    """Adds a new recipe to the timelines of its author's followers."""
+    if is_celebrity(recipe.author):
+        return
+    follower_ids = Subscription.objects.filter(
+        follow=recipe.author_id
+    ).values_list('follower_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=follower_id,
+                recipe_id=recipe.id,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for follower_id in follower_ids.iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def follow(user_id, author):
+    """Backfills the timeline with the newest recipes of a new author."""
+    if is_celebrity(author):
+        return 0
+    recipes = Recipe.objects.filter(author=author).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL]
+    return len(FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author.id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes
+        ],
+        ignore_conflicts=True,
+    ))
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user=user_id, author=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Recreates the timelines from the subscriptions; returns the rows."""
+    entries = FeedEntry.objects.all()
+    subscriptions = Subscription.objects.select_related('follow')
+    if user_ids is not None:
+        entries = entries.filter(user__in=user_ids)
+        subscriptions = subscriptions.filter(follower__in=user_ids)
+    entries.delete()
+    return sum(
+        follow(subscription.follower_id, subscription.follow)
+        for subscription in subscriptions.iterator()
+    )
+
+
+def before(position, date_field, id_field):
+    """Rows strictly after ``position`` in (date, id) descending order."""
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(
+        **{date_field: pub_date, f'{id_field}__lt': recipe_id}
+    )
+
+
+def page(user, position=None, size=10):
+    """
+    The next ``size`` (pub_date, recipe id) pairs of the user's feed
+    after ``position``, newest first, and whether more follow.
+    """
+    stored = FeedEntry.objects.filter(
+        before(position, 'pub_date', 'recipe_id'), user=user,
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:size + 1]
+    celebrities = CustomUser.objects.filter(
+        follow_user__follower=user,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values('id')
+    read = Recipe.objects.filter(
+        before(position, 'pub_date', 'id'), author__in=celebrities,
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:size + 1]
+    rows = []
+    seen = set()
+    # entries copied before the author became a celebrity are read twice
+    for row in heapq.merge(list(stored), list(read), reverse=True):
+        if row[1] in seen:
+            continue
+        seen.add(row[1])
+        rows.append(row)
+        if len(rows) > size:
+            break
+    return rows[:size], len(rows) > size
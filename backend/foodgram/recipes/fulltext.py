@@ -0,0 +1,155 @@
+"""
+Ranked full-text search over recipe names and texts, the name weighing
+more than the text. PostgreSQL keeps a stored, GIN-indexed tsvector
+column next to the recipe; SQLite keeps an FTS5 table in step with the
+recipes through triggers. Neither is known to the ORM, so both are
+reached through raw SQL fragments here.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+NAME_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+
+WORD_RE = re.compile(r'\w+')
+
+POSTGRESQL_SETUP = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+    'tsvector GENERATED ALWAYS AS ('
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')"
+    ') STORED',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRESQL_TEARDOWN = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5('
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+# dropped by every migration that rebuilds the recipe table, so they
+# are recreated after each migrate as well
+SQLITE_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert '
+    'AFTER INSERT ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete '
+    'AFTER DELETE ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update '
+    'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+)
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')"
+)
+SQLITE_TEARDOWN = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def setup(connection):
+    """Creates the search column or table and fills it."""
+    if connection.vendor == 'postgresql':
+        execute(connection, POSTGRESQL_SETUP)
+    elif connection.vendor == 'sqlite':
+        execute(connection, (SQLITE_TABLE, *SQLITE_TRIGGERS, SQLITE_REBUILD))
+
+
+def teardown(connection):
+    if connection.vendor == 'postgresql':
+        execute(connection, POSTGRESQL_TEARDOWN)
+    elif connection.vendor == 'sqlite':
+        execute(connection, SQLITE_TEARDOWN)
+
+
+def restore_sqlite_triggers(connection):
+    """
+    Recreates the SQLite triggers if a migration rebuilt the recipe
+    table, and rebuilds the index the rows were copied past.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    if 'recipes_recipe_fts' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE 'recipes_recipe_fts_%'"
+        )
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+            return
+    execute(connection, (*SQLITE_TRIGGERS, SQLITE_REBUILD))
+
+
+def sqlite_match(query):
+    """Every word of the query as a quoted prefix term, all required."""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def search_recipes(queryset, query):
+    """
+    Recipes of ``queryset`` matching every word of ``query``, annotated
+    with ``search_rank`` (higher is better) and ordered by it.
+    """
+    if not WORD_RE.search(query):
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        tsquery = f"plainto_tsquery('{SEARCH_CONFIG}', %s)"
+        queryset = queryset.annotate(
+            search_match=RawSQL(
+                f'recipes_recipe.search_vector @@ {tsquery}',
+                (query,),
+                output_field=BooleanField(),
+            ),
+            search_rank=RawSQL(
+                f'ts_rank(recipes_recipe.search_vector, {tsquery})',
+                (query,),
+                output_field=FloatField(),
+            ),
+        ).filter(search_match=True)
+    elif connection.vendor == 'sqlite':
+        # joined rather than queried per row, so the index is walked once
+        queryset = queryset.extra(
+            tables=['recipes_recipe_fts'],
+            where=[
+                'recipes_recipe_fts.rowid = recipes_recipe.id',
+                'recipes_recipe_fts MATCH %s',
+            ],
+            params=[sqlite_match(query)],
+            select={
+                'search_rank': '-bm25(recipes_recipe_fts, %s, %s)',
+            },
+            select_params=(NAME_WEIGHT, TEXT_WEIGHT),
+        )
+    else:
+        condition = Q()
+        for word in WORD_RE.findall(query):
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        queryset = queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,101 @@
+"""
+Resized WebP variants of recipe images. They are built by a small
+in-process thread pool after the request that stored the original has
+committed, so uploads return as soon as the original is saved.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_recipe_version
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# name -> longest side in pixels
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+VARIANTS_DIR = 'recipes/images/variants/'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def schedule_variants(recipe_id):
+    """Queues building the variants once the transaction commits."""
+    transaction.on_commit(
+        lambda: get_executor().submit(run_build_variants, recipe_id)
+    )
+
+
+def run_build_variants(recipe_id):
+    close_old_connections()
+    try:
+        build_variants(recipe_id)
+    except Exception:
+        logger.exception('Could not build image variants of %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, 'WEBP', quality=80, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(recipe_id):
+    """
+    Renders every variant of the recipe's current image and records
+    them, unless the image was replaced in the meantime.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants'
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        variants = {
+            name: default_storage.save(
+                f'{VARIANTS_DIR}{recipe_id}/{name}.webp',
+                render_variant(image, size),
+            )
+            for name, size in VARIANTS.items()
+        }
+    variants['source'] = source
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants
+    )
+    stale = variants if not updated else recipe.image_variants
+    delete_variants(stale)
+    if updated:
+        bump_recipe_version(recipe_id)
+
+
+def delete_variants(variants):
+    for name in VARIANTS:
+        if variants.get(name):
+            default_storage.delete(variants[name])
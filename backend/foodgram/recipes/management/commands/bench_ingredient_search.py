@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+from recipes.search import fuzzy_search, ingredient_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays typed ingredient names keystroke by keystroke against '
+        'the autocomplete index and the icontains query it replaces'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, label, queries, search):
+        timings = []
+        started = time.perf_counter()
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        total = time.perf_counter() - started
+        timings.sort()
+        self.stdout.write(
+            f'{label:>10}: {len(queries) / total:9.0f} req/s  '
+            f'p50 {statistics.median(timings):.3f} ms  '
+            f'p99 {timings[int(len(timings) * 0.99) - 1]:.3f} ms'
+        )
+
+    @staticmethod
+    def misspell(word):
+        """Swaps two neighbouring letters, the most common typo."""
+        if len(word) < 4:
+            return word
+        position = random.randrange(1, len(word) - 2)
+        return (
+            word[:position] + word[position + 1]
+            + word[position] + word[position + 2:]
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('The ingredient catalog is empty')
+            return
+        random.seed(options['seed'])
+        words = random.choices(names, k=options['words'])
+        queries = [
+            word[:length]
+            for word in words
+            for length in range(1, len(word) + 1)
+        ]
+        limit = options['limit']
+        ingredient_index.search('', 1)
+        self.stdout.write(
+            f'{len(names)} ingredients, {len(queries)} keystrokes'
+        )
+        self.measure(
+            'index',
+            queries,
+            lambda query: ingredient_index.search(query, limit),
+        )
+        self.measure(
+            'icontains',
+            queries,
+            lambda query: list(
+                Ingredient.objects.filter(name__icontains=query)[:limit]
+            ),
+        )
+        typos = [self.misspell(word) for word in words]
+        self.stdout.write(f'{len(typos)} misspelled names')
+        self.measure(
+            'fuzzy',
+            typos,
+            lambda query: fuzzy_search(query, limit),
+        )
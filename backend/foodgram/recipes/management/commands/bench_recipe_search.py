@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.fulltext import search_recipes
+from recipes.models import Ingredient, Recipe
+from users.models import CustomUser
+
+WORDS = (
+    'суп салат пирог каша запеканка соус рагу жаркое десерт торт '
+    'быстро просто сытно легко остро сладко домашний праздничный '
+    'нарезать обжарить варить запечь смешать подавать посолить'
+).split()
+SYLLABLES = 'ба ве ги до ку ла ме ни ор пу ра се ти фу ха це ша'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Times ranked full-text recipe search against the icontains scan '
+        'over name and text, optionally on generated recipes that are '
+        'rolled back afterwards (e.g. --recipes 1000000)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=0,
+            help='Generate this many extra recipes for the run',
+        )
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def generate(self, count, vocabulary):
+        author = CustomUser.objects.order_by('id').first()
+        if author is None:
+            raise CommandError('Need at least one user')
+        started = time.perf_counter()
+        for start in range(0, count, 5000):
+            Recipe.objects.bulk_create([
+                Recipe(
+                    author=author,
+                    name=' '.join(random.choices(vocabulary, k=3)),
+                    text=' '.join(random.choices(vocabulary, k=40)),
+                    cooking_time=1,
+                )
+                for _ in range(start, min(start + 5000, count))
+            ])
+        self.stdout.write(
+            f'Generated {count} recipes in '
+            f'{time.perf_counter() - started:.1f} s'
+        )
+
+    def measure(self, label, queries, search, page_size):
+        timings = []
+        found = 0
+        for query in queries:
+            start = time.perf_counter()
+            queryset = search(query)
+            found += queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label:>10}: p50 {statistics.median(timings):.1f} ms  '
+            f'max {timings[-1]:.1f} ms  '
+            f'{found / len(queries):.0f} matches per query'
+        )
+
+    @staticmethod
+    def icontains(query):
+        condition = Q()
+        for word in query.split():
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return Recipe.objects.filter(condition).order_by('-pub_date', '-id')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        # a catalog-sized vocabulary, so that words are about as rare
+        # in the generated texts as in real recipes
+        vocabulary = WORDS + [
+            name.split()[0].lower()
+            for name in Ingredient.objects.values_list('name', flat=True)
+        ] + [
+            ''.join(random.choices(SYLLABLES, k=3)) for _ in range(5000)
+        ]
+        queries = [
+            ' '.join(random.sample(vocabulary, k=random.randint(1, 2)))
+            for _ in range(options['queries'])
+        ]
+        with transaction.atomic():
+            if options['recipes']:
+                self.generate(options['recipes'], vocabulary)
+            self.stdout.write(
+                f'{Recipe.objects.count()} recipes, {len(queries)} queries'
+            )
+            self.measure(
+                'icontains', queries, self.icontains, options['page_size']
+            )
+            self.measure(
+                'full-text',
+                queries,
+                lambda query: search_recipes(Recipe.objects.all(), query),
+                options['page_size'],
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,104 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.filters import get_tag_ids
+from recipes.models import Recipe, Tag
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Times a page of a tag-filtered recipe list with the tag join and '
+        'DISTINCT it replaces and with the semi-join, optionally on '
+        'generated recipes that are rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=0,
+            help='Generate this many extra recipes for the run',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def generate(self, count):
+        author = CustomUser.objects.order_by('id').first()
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if author is None or not tag_ids:
+            raise CommandError('Need at least one user and one tag')
+        Through = Recipe.tags.through
+        for start in range(0, count, 1000):
+            batch = Recipe.objects.bulk_create([
+                Recipe(
+                    author=author,
+                    name=f'bench {number}',
+                    text='bench',
+                    cooking_time=1,
+                )
+                for number in range(start, min(start + 1000, count))
+            ])
+            # SQLite does not return the ids of bulk inserted rows
+            recipe_ids = Recipe.objects.order_by('-id').values_list(
+                'id', flat=True
+            )[:len(batch)]
+            Through.objects.bulk_create([
+                Through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in random.sample(
+                    tag_ids, random.randint(1, len(tag_ids))
+                )
+            ])
+
+    def measure(self, label, queryset, repeat, page_size):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'  {label:>10}: p50 {statistics.median(timings):.2f} ms  '
+            f'max {timings[-1]:.2f} ms  ({queryset.count()} recipes)'
+        )
+
+    def run(self, options):
+        slugs = sorted(get_tag_ids())
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        self.stdout.write(f'{Recipe.objects.count()} recipes')
+        for size in range(1, min(len(slugs), 3) + 1):
+            for chosen in itertools.islice(
+                itertools.combinations(slugs, size), 3
+            ):
+                self.stdout.write(f'tags={",".join(chosen)}')
+                self.measure(
+                    'distinct',
+                    recipes.filter(tags__slug__in=chosen).distinct(),
+                    options['repeat'],
+                    options['page_size'],
+                )
+                tag_ids = get_tag_ids()
+                self.measure(
+                    'semi-join',
+                    recipes.filter(id__in=Recipe.tags.through.objects.filter(
+                        tag_id__in=[tag_ids[slug] for slug in chosen]
+                    ).values('recipe_id')),
+                    options['repeat'],
+                    options['page_size'],
+                )
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            if options['recipes']:
+                self.generate(options['recipes'])
+            self.run(options)
+            transaction.set_rollback(True)
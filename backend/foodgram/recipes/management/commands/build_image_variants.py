@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the resized image variants of recipes that do not have '
+        'them yet, e.g. after a worker restart lost queued jobs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild the variants of every recipe',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'image', 'image_variants'
+        )
+        count = 0
+        for recipe in recipes.iterator():
+            current = recipe.image_variants.get('source') == recipe.image.name
+            if current and not options['all']:
+                continue
+            build_variants(recipe.id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Built variants of {count} recipes'))
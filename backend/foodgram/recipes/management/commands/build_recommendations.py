@@ -0,0 +1,60 @@
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import build
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes the most similar recipes of each recipe from co-favorites '
+        '(item-item cosine similarity); reruns only recompute the recipes '
+        'affected by favorites changed since the last run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=settings.RECOMMENDATION_NEIGHBOURS,
+            help='Neighbours kept per recipe',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every recipe instead of the changed ones',
+        )
+        parser.add_argument(
+            '--max-user-favorites',
+            type=int,
+            default=1000,
+            help='Ignore users with more favorites than this (0: keep all)',
+        )
+        parser.add_argument(
+            '--min-common',
+            type=int,
+            default=1,
+            help='Users two recipes must share to be neighbours',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix, recomputed = build(
+            count=options['neighbours'],
+            full=options['full'],
+            max_user_favorites=options['max_user_favorites'] or None,
+            min_common=options['min_common'],
+        )
+        # kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'{matrix.favorites} favorites of {len(matrix.offsets) - 1} '
+            f'users over {len(matrix.users)} recipes'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed neighbours of {recomputed} recipes in '
+            f'{time.perf_counter() - started:.2f} s, '
+            f'peak memory {peak:.1f} MiB'
+        ))
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+    Subscription,
+)
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints the query plan and timing of the hot favorite, cart, '
+        'subscription and author lookups; run it before and after '
+        'migrating to compare the plans'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--output',
+            help='Also write the report to this file',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE (PostgreSQL only)',
+        )
+
+    def queries(self):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        user = CustomUser.objects.order_by('-followers_count').first()
+        if recipe is None or user is None:
+            raise CommandError('Need at least one user and one recipe')
+        follower = Subscription.objects.filter(
+            follow=user
+        ).values_list('follower', flat=True).first() or user.id
+        return {
+            'favorite exists': Favorite.objects.filter(
+                user=follower, recipe=recipe
+            ),
+            'cart exists': ShoppingCart.objects.filter(
+                user=follower, recipe=recipe
+            ),
+            'subscription exists': Subscription.objects.filter(
+                follower=follower, follow=user
+            ),
+            'favorited recipes': Recipe.objects.filter(
+                id__in=Favorite.objects.filter(
+                    user=follower
+                ).values('recipe_id')
+            ).order_by('-pub_date', '-id')[:6],
+            'carted recipes': Recipe.objects.filter(
+                id__in=ShoppingCart.objects.filter(
+                    user=follower
+                ).values('recipe_id')
+            ).order_by('-pub_date', '-id')[:6],
+            'followed authors': CustomUser.objects.filter(
+                id__in=Subscription.objects.filter(
+                    follower=follower
+                ).values('follow_id')
+            ).order_by('id')[:6],
+            'author recipes': Recipe.objects.filter(
+                author=recipe.author_id
+            ).order_by('-pub_date', '-id')[:6],
+            'shopping list': ShoppingListItem.objects.filter(
+                user=follower
+            ).order_by('ingredient__name'),
+        }
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze needs PostgreSQL')
+            explain_options['analyze'] = True
+        lines = [f'{connection.vendor}, {Recipe.objects.count()} recipes']
+        for label, queryset in self.queries().items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            lines.append(
+                f'== {label}: p50 {statistics.median(timings):.3f} ms'
+            )
+            lines.append(queryset.explain(**explain_options))
+        report = '\n'.join(lines)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report + '\n')
@@ -1,24 +1,145 @@
 import json
+import time
+from itertools import islice
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from recipes.cache import (
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    bump_recipe_version,
+    bump_version,
+)
 from recipes.models import Ingredient, Tag
 
+
+def read_array_start(file, chunk_size):
+    """Reads past the opening bracket; returns what was read after it."""
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if buffer[:1] != '[':
+        raise ValueError('Expected a JSON array')
+    return buffer[1:]
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    Yields the items of a top level JSON array one by one, reading the
+    file in chunks instead of loading it whole.
+    """
+    decoder = json.JSONDecoder()
+    buffer = read_array_start(file, chunk_size)
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer[:1] == ']':
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                end = None
+            # a number at the end of the buffer may continue in the
+            # next chunk
+            if end is not None and (end < len(buffer) or eof):
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise ValueError('Unexpected end of JSON array')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class Command(BaseCommand):
+    help = (
+        'Loads the ingredient and tag catalogs; rows that already exist '
+        'are kept, so the command is safe to rerun'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default='data/ingredients.json',
+            help='Ingredients JSON file, e.g. data/ingredients_full.json',
+        )
+        parser.add_argument('--tags', default='data/tags.json')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
     def handle(self, *args, **options) -> None:
-        
-        with open('data/ingredients.json', 'rb') as f:
-          data = json.load(f)
-          for i in data:
-            ingredient = Ingredient()
-            ingredient.name  = i['name']
-            ingredient.measurement_unit = i['measurement_unit']
-            ingredient.save()
-
-        with open('data/tags.json', 'rb') as f:
-          data = json.load(f)
-          for i in data:
-            tag = Tag()
-            tag.name  = i['name']
-            tag.color = i['color']
-            tag.slug = i['slug']
-            tag.save()
\ No newline at end of file
+        started = time.perf_counter()
+        with transaction.atomic():
+            ingredients = self.load_ingredients(
+                options['ingredients'], options['batch_size']
+            )
+            tags = self.load_tags(options['tags'])
+        elapsed = time.perf_counter() - started
+        bump_version(INGREDIENTS_VERSION_KEY)
+        bump_version(TAGS_VERSION_KEY)
+        bump_recipe_version()
+
+        total = ingredients + tags
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {ingredients} ingredients and {tags} tags in '
+            f'{elapsed:.2f} s ({total / elapsed:.0f} rows/s)'
+        ))
+
+    def load_ingredients(self, path, batch_size):
+        count = 0
+        before = Ingredient.objects.count()
+        with open(path, encoding='utf-8') as file:
+            for batch in batches(iter_json_array(file), batch_size):
+                Ingredient.objects.bulk_create(
+                    [
+                        Ingredient(
+                            name=item['name'],
+                            measurement_unit=item['measurement_unit'],
+                        )
+                        for item in batch
+                    ],
+                    ignore_conflicts=True,
+                )
+                count += len(batch)
+        self.stdout.write(
+            f'Ingredients: {Ingredient.objects.count() - before} new'
+        )
+        return count
+
+    def load_tags(self, path):
+        with open(path, encoding='utf-8') as file:
+            tags = {item['slug']: item for item in iter_json_array(file)}
+        existing = Tag.objects.in_bulk(tags, field_name='slug')
+        changed = []
+        for slug, tag in existing.items():
+            if (tag.name, tag.color) != (tags[slug]['name'],
+                                         tags[slug]['color']):
+                tag.name = tags[slug]['name']
+                tag.color = tags[slug]['color']
+                changed.append(tag)
+        Tag.objects.bulk_update(changed, ['name', 'color'])
+        created = Tag.objects.bulk_create(
+            [
+                Tag(name=item['name'], color=item['color'], slug=slug)
+                for slug, item in tags.items() if slug not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        self.stdout.write(
+            f'Tags: {len(created)} new, {len(changed)} updated'
+        )
+        return len(tags)
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.cache import bump_recipe_version
+from recipes.models import Recipe
+from recipes.storage import content_hash, is_hashed_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves recipe images stored under upload names into the '
+        'content-addressed layout, merging identical files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be moved',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        legacy = sorted(name for name in names if not is_hashed_name(name))
+        moved = merged = missing = 0
+        for name in legacy:
+            if not storage.exists(name):
+                self.stderr.write(f'Missing file: {name}')
+                missing += 1
+                continue
+            if options['dry_run']:
+                moved += 1
+                continue
+            with storage.open(name, 'rb') as file:
+                target = storage.hashed_name(name, content_hash(file))
+                if storage.exists(target):
+                    merged += 1
+                else:
+                    target = storage.save(name, file)
+            self.relink(name, target)
+            storage.delete(name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} images ({merged} merged into existing files, '
+            f'{missing} missing)'
+        ))
+
+    @staticmethod
+    def relink(name, target):
+        with transaction.atomic():
+            recipes = Recipe.objects.select_for_update().filter(
+                image=name
+            ).only('image_variants')
+            for recipe in recipes:
+                variants = recipe.image_variants
+                if variants.get('source') == name:
+                    variants['source'] = target
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image=target, image_variants=variants
+                )
+                bump_recipe_version(recipe.pk)
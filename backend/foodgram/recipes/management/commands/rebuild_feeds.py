@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recreates the followed-authors timelines from the subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Only rebuild the timeline of this user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} feed entries'))
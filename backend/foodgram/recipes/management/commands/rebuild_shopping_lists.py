@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.shopping_list import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the shopping list totals from the shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Only rebuild the totals of this user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {count} shopping list rows')
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Recounts favorites, recipes and followers and fixes the stored '
+        'counters that have drifted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the drifted counters',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile(dry_run=options['dry_run'])
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: {count} drifted')
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {sum(drift.values())} drifted counters'
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:01
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Points everything at the oldest copy of repeated catalog rows."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep=Min('id'), copies=Count('id')
+    ).filter(copies__gt=1)
+    for group in duplicates:
+        copies = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keep'])
+        RecipeIngredient.objects.filter(
+            ingredient__in=copies
+        ).update(ingredient=group['keep'])
+        for item in ShoppingListItem.objects.filter(ingredient__in=copies):
+            kept, created = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id,
+                ingredient_id=group['keep'],
+                defaults={'amount': item.amount},
+            )
+            if not created:
+                kept.amount += item.amount
+                kept.save(update_fields=['amount'])
+            item.delete()
+        copies.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_ingredient_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
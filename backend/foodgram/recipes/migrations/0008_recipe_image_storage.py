@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:06
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, help_text='Загрузите картинку рецепта', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:12
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(model, fields):
+    """
+    Deletes all but the oldest row of each group of rows repeating
+    ``fields`` and returns the groups that had duplicates.
+    """
+    groups = list(
+        model.objects.values(*fields).annotate(
+            keep=Min('id'), copies=Count('id')
+        ).filter(copies__gt=1).order_by()
+    )
+    for group in groups:
+        model.objects.filter(
+            **{field: group[field] for field in fields}
+        ).exclude(id=group['keep']).delete()
+    return groups
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Removes repeated favorites, cart entries and subscriptions, then
+    recomputes the favorites counters, shopping list totals and follower
+    counters they had inflated.
+    """
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    Subscription = apps.get_model('recipes', 'Subscription')
+
+    recipe_ids = {
+        group['recipe'] for group in delete_duplicates(
+            Favorite, ('user', 'recipe')
+        )
+    }
+    if recipe_ids:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            favorites_count=Coalesce(
+                Subquery(
+                    Favorite.objects.filter(
+                        recipe=OuterRef('pk')
+                    ).order_by().values('recipe').annotate(
+                        count=Count('pk')
+                    ).values('count')
+                ),
+                0,
+            )
+        )
+
+    user_ids = {
+        group['user'] for group in delete_duplicates(
+            ShoppingCart, ('user', 'recipe')
+        )
+    }
+    if user_ids:
+        ShoppingListItem.objects.filter(user__in=user_ids).delete()
+        totals = RecipeIngredient.objects.filter(
+            recipe__shoppinglist__user__in=user_ids
+        ).values(
+            'ingredient',
+            user_id=F('recipe__shoppinglist__user'),
+        ).annotate(
+            total=Sum('amount')
+        ).values_list('user_id', 'ingredient', 'total').order_by()
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=total
+                )
+                for user_id, ingredient_id, total in totals
+            ],
+            batch_size=1000,
+        )
+
+    follow_ids = {
+        group['follow'] for group in delete_duplicates(
+            Subscription, ('follower', 'follow')
+        )
+    }
+    if follow_ids:
+        CustomUser.objects.filter(id__in=follow_ids).update(
+            followers_count=Coalesce(
+                Subquery(
+                    Subscription.objects.filter(
+                        follow=OuterRef('pk')
+                    ).order_by().values('follow').annotate(
+                        count=Count('pk')
+                    ).values('count')
+                ),
+                0,
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_favorites_count'),
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('recipe', 'user'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('follower', 'follow'), name='unique_subscription'),
+        ),
+    ]
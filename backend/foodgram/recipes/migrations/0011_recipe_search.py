@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes import fulltext
+
+
+def create_search_index(apps, schema_editor):
+    fulltext.setup(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    fulltext.teardown(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_social_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Время отсчёта затухания'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_count',
+            field=models.FloatField(default=0, editable=False, verbose_name='Затухающее число добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность сейчас'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_score_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 
-from users.models import CustomUser
+from users.models import ConcurrentFieldsMixin, CustomUser
+
+from .storage import ContentAddressedStorage
 
 
 class Tag(models.Model):
@@ -23,12 +25,18 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиенты'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(ConcurrentFieldsMixin, models.Model):
     author = models.ForeignKey(
         CustomUser,
         related_name='recipe_user',
@@ -53,15 +61,69 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         blank=True,
+        db_index=True,
         help_text='Загрузите картинку рецепта'
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    trending_count = models.FloatField(
+        verbose_name='Затухающее число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    trending_at = models.DateTimeField(
+        verbose_name='Время отсчёта затухания',
+        null=True,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность сейчас',
+        default=0,
+        editable=False,
+    )
+
+    concurrent_fields = (
+        'image_variants',
+        'favorites_count',
+        'trending_count',
+        'trending_at',
+        'trending_score',
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_score_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -107,6 +169,12 @@ class ShoppingCart(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_shopping_cart'
+            )
+        ]
 
     def __str__(self):
         return self.recipe.name
@@ -135,6 +203,12 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='favorite_user_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Пользователь: {self.user} - Рецепт: {self.recipe}'
@@ -158,6 +232,12 @@ class Subscription(models.Model):
         ordering = ['id']
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'follow'],
+                name='unique_subscription'
+            )
+        ]
 
     def __str__(self):
         follow_name = (
@@ -165,3 +245,133 @@ class Subscription(models.Model):
             f'Подписчик: {self.follower.username}'
         )
         return follow_name
+
+
+class ShoppingListItem(models.Model):
+    """Ingredient totals of a user's shopping cart, kept up to date."""
+    user = models.ForeignKey(
+        CustomUser,
+        verbose_name='Пользователь',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Итоги списка покупок'
+        verbose_name_plural = 'Итоги списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'Пользователь: {self.user_id} - {self.ingredient_id}'
+
+
+class FeedEntry(models.Model):
+    """A recipe of a followed author in a user's timeline."""
+    user = models.ForeignKey(
+        CustomUser,
+        verbose_name='Читатель',
+        related_name='feed_entries',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        verbose_name='Автор',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Лента'
+        verbose_name_plural = 'Лента'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_timeline_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Пользователь: {self.user_id} - {self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    """Precomputed neighbour of a recipe by co-favorites."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        on_delete=models.CASCADE
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField(verbose_name='Косинусная близость')
+
+    class Meta:
+        verbose_name = 'Похожие рецепты'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} - {self.similar_id}: {self.score:.3f}'
+
+
+class SimilarityDigest(models.Model):
+    """
+    Fingerprint of the set of users who favorited a recipe when its
+    neighbours were last computed, to recompute only what changed.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='similarity_digest',
+        on_delete=models.CASCADE
+    )
+    digest = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = 'Отпечаток избранного'
+        verbose_name_plural = 'Отпечатки избранного'
@@ -0,0 +1,149 @@
+"""
+"What can I cook": recipes ranked by how much of their ingredient list
+a set of ingredients at hand covers. An in-process inverted index maps
+each ingredient to the sorted array of recipes using it, so a query
+reads only the postings of the ingredients it names.
+
+Recipe writes are logged in the cache under consecutive versions, and
+every process replays the log into its own index on the next query; it
+rebuilds from scratch only if it fell too far behind or the log was
+evicted.
+"""
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import RecipeIngredient
+
+PANTRY_VERSION_KEY = 'pantry:version'
+PANTRY_CHANGE_KEY = 'pantry:change:{}'
+# changes older than this or further back are not replayed
+CHANGE_TIMEOUT = 60 * 60
+MAX_REPLAY = 1000
+
+
+def recipe_changed(recipe_id):
+    """Logs a change of the recipe's ingredients once it commits."""
+    transaction.on_commit(lambda: _log_change(recipe_id))
+
+
+def _log_change(recipe_id):
+    try:
+        version = cache.incr(PANTRY_VERSION_KEY)
+    except ValueError:
+        cache.set(PANTRY_VERSION_KEY, time.time_ns(), timeout=None)
+        return
+    cache.set(
+        PANTRY_CHANGE_KEY.format(version), recipe_id, timeout=CHANGE_TIMEOUT
+    )
+
+
+def insert(postings, recipe_id):
+    position = bisect_left(postings, recipe_id)
+    if position == len(postings) or postings[position] != recipe_id:
+        postings.insert(position, recipe_id)
+
+
+def remove(postings, recipe_id):
+    position = bisect_left(postings, recipe_id)
+    if position < len(postings) and postings[position] == recipe_id:
+        del postings[position]
+
+
+class PantryIndex:
+
+    def __init__(self):
+        self._version = None
+        # ingredient id -> sorted array of recipe ids
+        self._postings = {}
+        # recipe id -> ingredient ids
+        self._recipes = {}
+        self._lock = Lock()
+
+    def _sync(self):
+        version = cache.get(PANTRY_VERSION_KEY)
+        if version is None:
+            cache.add(PANTRY_VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(PANTRY_VERSION_KEY)
+        if version == self._version:
+            return
+        behind = (version - self._version) if self._version else 0
+        if 0 < behind <= MAX_REPLAY:
+            changes = cache.get_many([
+                PANTRY_CHANGE_KEY.format(self._version + step)
+                for step in range(1, behind + 1)
+            ])
+            if len(changes) == behind:
+                self._replay(set(changes.values()))
+                self._version = version
+                return
+        self._build()
+        self._version = version
+
+    def _rows(self, **filters):
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            **filters
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            recipes[recipe_id].add(ingredient_id)
+        return recipes
+
+    def _build(self):
+        recipes = self._rows()
+        postings = defaultdict(list)
+        for recipe_id in sorted(recipes):
+            for ingredient_id in recipes[recipe_id]:
+                postings[ingredient_id].append(recipe_id)
+        self._postings = {
+            ingredient_id: array('q', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self._recipes = {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def _replay(self, recipe_ids):
+        current = self._rows(recipe_id__in=recipe_ids)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                remove(self._postings[ingredient_id], recipe_id)
+            ingredients = current.get(recipe_id)
+            if not ingredients:
+                continue
+            for ingredient_id in ingredients:
+                insert(
+                    self._postings.setdefault(ingredient_id, array('q')),
+                    recipe_id,
+                )
+            self._recipes[recipe_id] = tuple(ingredients)
+
+    def match(self, ingredient_ids, max_missing=None, limit=None):
+        """
+        Recipes using any of ``ingredient_ids`` as (recipe id, covered,
+        total) tuples: the most fully covered first, then those missing
+        the fewest ingredients, then the newest. With ``max_missing``
+        recipes lacking more ingredients than that are left out.
+        """
+        with self._lock:
+            self._sync()
+            covered = Counter()
+            for ingredient_id in set(ingredient_ids):
+                covered.update(self._postings.get(ingredient_id, ()))
+            matches = []
+            for recipe_id, count in covered.items():
+                total = len(self._recipes[recipe_id])
+                if max_missing is None or total - count <= max_missing:
+                    matches.append((recipe_id, count, total))
+        matches.sort(key=lambda match: (
+            -match[1] / match[2], match[2] - match[1], -match[0]
+        ))
+        return matches[:limit]
+
+
+pantry_index = PantryIndex()
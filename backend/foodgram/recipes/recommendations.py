@@ -0,0 +1,169 @@
+"""
+"Similar recipes" from co-favorites: item-item cosine similarity over the
+binary user x recipe favorites matrix, computed offline by the
+build_recommendations command and stored in SimilarRecipe.
+
+The matrix is held once in both orientations as flat integer arrays
+(compressed rows of recipes per user and of users per recipe), so
+memory grows with the number of favorites only. The neighbours of one
+recipe are then accumulated from the rows of the users who favorited
+it, and only the top K are kept. Reruns recompute only the recipes whose
+favorites changed since the last run and the recipes related to them.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Favorite, SimilarityDigest, SimilarRecipe
+
+MASK = (1 << 63) - 1
+
+
+def mix(value):
+    """splitmix64 finalizer: spreads user ids over 64 bits."""
+    value = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+class FavoritesMatrix:
+
+    def __init__(self, max_user_favorites=None):
+        self.max_user_favorites = max_user_favorites
+        # recipes of user row n: recipes[offsets[n]:offsets[n + 1]]
+        self.offsets = array('q', [0])
+        self.recipes = array('q')
+        # user rows of each recipe
+        self.users = defaultdict(lambda: array('q'))
+        # order independent fingerprint of each recipe's users
+        self.digests = defaultdict(int)
+        self.favorites = 0
+
+    def load(self, chunk_size=10000):
+        """Streams the favorites ordered by user into the arrays."""
+        pairs = Favorite.objects.order_by('user_id').values_list(
+            'user_id', 'recipe_id'
+        ).iterator(chunk_size=chunk_size)
+        current, row = None, []
+        counts = Counter()
+        for user_id, recipe_id in pairs:
+            if user_id != current:
+                self.add_row(row)
+                current, row = user_id, []
+            row.append(recipe_id)
+            self.digests[recipe_id] ^= mix(user_id)
+            counts[recipe_id] += 1
+        self.add_row(row)
+        for recipe_id, count in counts.items():
+            self.digests[recipe_id] = (
+                self.digests[recipe_id] ^ mix(-count)
+            ) & MASK
+        self.favorites = sum(counts.values())
+        return self
+
+    def add_row(self, row):
+        # a user who favorited nearly everything says little about
+        # similarity and costs the square of their favorites
+        if not row or (
+            self.max_user_favorites and len(row) > self.max_user_favorites
+        ):
+            return
+        user_row = len(self.offsets) - 1
+        for recipe_id in row:
+            self.users[recipe_id].append(user_row)
+        self.recipes.extend(row)
+        self.offsets.append(len(self.recipes))
+
+    def row(self, user_row):
+        return self.recipes[self.offsets[user_row]:self.offsets[user_row + 1]]
+
+    def related(self, recipe_ids):
+        """Recipes sharing a favoriting user with any of ``recipe_ids``."""
+        related = set()
+        for recipe_id in recipe_ids:
+            for user_row in self.users.get(recipe_id, ()):
+                related.update(self.row(user_row))
+        return related
+
+    def neighbours(self, recipe_id, count, min_common=1):
+        """Top ``count`` (score, recipe id) by cosine similarity."""
+        users = self.users.get(recipe_id)
+        if not users:
+            return []
+        common = Counter()
+        for user_row in users:
+            common.update(self.row(user_row))
+        del common[recipe_id]
+        size = len(users)
+        return heapq.nlargest(count, (
+            (shared / math.sqrt(size * len(self.users[other])), other)
+            for other, shared in common.items()
+            if shared >= min_common
+        ))
+
+
+def changed_recipes(matrix):
+    """Recipes whose favoriting users differ from the last run."""
+    stored = dict(SimilarityDigest.objects.values_list('recipe_id', 'digest'))
+    changed = {
+        recipe_id for recipe_id, digest in matrix.digests.items()
+        if stored.get(recipe_id) != digest
+    }
+    return changed | (stored.keys() - matrix.digests.keys())
+
+
+def build(count=20, full=False, max_user_favorites=None, min_common=1,
+          batch_size=500):
+    """
+    Recomputes and stores the neighbours of the recipes that need it;
+    returns (matrix, number of recipes recomputed).
+    """
+    matrix = FavoritesMatrix(max_user_favorites).load()
+    if full:
+        stale = set(matrix.users) | set(
+            SimilarRecipe.objects.values_list('recipe_id', flat=True)
+        )
+        changed = set(matrix.digests) | set(
+            SimilarityDigest.objects.values_list('recipe_id', flat=True)
+        )
+    else:
+        changed = changed_recipes(matrix)
+        # their scores moved in the lists of every related recipe, and
+        # lists that held a recipe it no longer shares users with
+        stale = changed | matrix.related(changed) | set(
+            SimilarRecipe.objects.filter(
+                similar__in=changed
+            ).values_list('recipe_id', flat=True)
+        )
+    recomputed = len(stale)
+    stale = iter(sorted(stale))
+    while True:
+        batch = list(islice(stale, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe__in=batch).delete()
+            SimilarRecipe.objects.bulk_create([
+                SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+                for recipe_id in batch
+                for score, other in matrix.neighbours(
+                    recipe_id, count, min_common
+                )
+            ])
+    changed = list(changed)
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        with transaction.atomic():
+            SimilarityDigest.objects.filter(recipe__in=batch).delete()
+            SimilarityDigest.objects.bulk_create([
+                SimilarityDigest(
+                    recipe_id=recipe_id, digest=matrix.digests[recipe_id]
+                )
+                for recipe_id in batch if recipe_id in matrix.digests
+            ])
+    return matrix, recomputed
@@ -0,0 +1,147 @@
+"""
+In-process index over the ingredient catalog for autocomplete and
+typo-tolerant search. The catalog is small (a few thousand rows) and
+read on every keystroke, so it is kept in memory sorted by name, with
+a trigram inverted index, and rebuilt when the ingredients version
+counter changes. Writes from other processes (load_data) may not reach
+that counter when the cache is per process, so the index is also
+rebuilt once it is INGREDIENT_INDEX_TTL seconds old.
+"""
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import INGREDIENTS_VERSION_KEY, get_version
+from .models import Ingredient
+
+WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Trigrams of a string, computed the way pg_trgm does."""
+    grams = set()
+    for word in WORD_RE.findall(text.casefold()):
+        word = f'  {word} '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._version = None
+        self._expires = 0
+        # (casefolded names, rows, trigrams of each row, postings),
+        # replaced as a whole so readers never see a half-built index
+        self._state = ([], [], [], {})
+        self._lock = Lock()
+
+    def _stale(self, version):
+        return version != self._version or time.monotonic() >= self._expires
+
+    def _load(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        if self._stale(version):
+            with self._lock:
+                if self._stale(version):
+                    self._build(version)
+        return self._state
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda row: (row[1].casefold(), row[0]),
+        )
+        grams = [trigrams(row[1]) for row in rows]
+        postings = defaultdict(list)
+        for position, row_grams in enumerate(grams):
+            for gram in row_grams:
+                postings[gram].append(position)
+        names = [row[1].casefold() for row in rows]
+        self._state = (names, rows, grams, dict(postings))
+        self._version = version
+        self._expires = time.monotonic() + settings.INGREDIENT_INDEX_TTL
+
+    def search(self, query, limit):
+        """
+        Ingredients whose name starts with ``query`` first, then the ones
+        with a word starting with it, then any other match; at most
+        ``limit`` of them.
+        """
+        names, rows, _, _ = self._load()
+        query = query.casefold()
+        if not query:
+            return [Ingredient(*row) for row in rows[:limit]]
+        found = []
+        position = bisect_left(names, query)
+        while (
+            position < len(names)
+            and len(found) < limit
+            and names[position].startswith(query)
+        ):
+            found.append(position)
+            position += 1
+        if len(found) < limit:
+            word_start, inside = [], []
+            for position, name in enumerate(names):
+                index = name.find(query)
+                if index <= 0:
+                    continue
+                if name[index - 1] in ' -(':
+                    word_start.append(position)
+                else:
+                    inside.append(position)
+            found += (word_start + inside)[:limit - len(found)]
+        return [Ingredient(*rows[position]) for position in found]
+
+    def fuzzy_search(self, query, limit, threshold):
+        """
+        Ingredients ranked by trigram similarity to ``query`` (shared
+        trigrams over all distinct trigrams, as pg_trgm's similarity()),
+        keeping those at or above ``threshold``.
+        """
+        _, rows, grams, postings = self._load()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for position in postings.get(gram, ()):
+                shared[position] += 1
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_grams) + len(grams[position]) - count
+            )
+            if similarity >= threshold:
+                scored.append((-similarity, position))
+        scored.sort()
+        return [Ingredient(*rows[position]) for _, position in scored[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+def fuzzy_search(query, limit):
+    """
+    Typo-tolerant ingredient search: pg_trgm and its GIN index on
+    PostgreSQL, the in-process trigram index elsewhere.
+    """
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return list(
+            Ingredient.objects.filter(
+                name__trigram_similar=query
+            ).annotate(
+                similarity=TrigramSimilarity('name', query)
+            ).order_by('-similarity', 'name')[:limit]
+        )
+    return ingredient_index.fuzzy_search(
+        query, limit, settings.INGREDIENT_FUZZY_THRESHOLD
+    )
@@ -0,0 +1,133 @@
+"""
+Maintenance of ShoppingListItem, the per-user ingredient totals of the
+shopping cart. Every change of a cart or of the ingredients of a carted
+recipe is applied to the totals as a delta, in the same transaction:
+carts from recipes.signals, ingredients from the API and admin writes.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def recipe_amounts(recipe_id):
+    """Amount of every ingredient of a recipe, {ingredient_id: amount}."""
+    return Counter(dict(
+        RecipeIngredient.objects.filter(recipe=recipe_id)
+        .values('ingredient')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient', 'total')
+    ))
+
+
+@transaction.atomic
+def apply_amounts(user_ids, amounts):
+    """Adds ``amounts`` (may be negative) to the totals of the users."""
+    amounts = {key: value for key, value in amounts.items() if value}
+    if not user_ids or not amounts:
+        return
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user__in=user_ids,
+            ingredient__in=amounts,
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, amount in amounts.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if amount > 0:
+                    to_create.append(ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    ))
+                continue
+            item.amount += amount
+            if item.amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.pk)
+    ShoppingListItem.objects.bulk_create(to_create)
+    ShoppingListItem.objects.bulk_update(to_update, ['amount'])
+    ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    apply_amounts([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_amounts(
+        [user_id],
+        {key: -value for key, value in recipe_amounts(recipe_id).items()}
+    )
+
+
+def recipe_changed(recipe_id, old_amounts, new_amounts=None):
+    """
+    Applies the difference between the old and the new ingredient
+    amounts of a recipe (read from the database when not given) to
+    every cart that contains it.
+    """
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipe_id)
+    delta = Counter(new_amounts)
+    delta.subtract(old_amounts)
+    user_ids = list(
+        ShoppingCart.objects.filter(recipe=recipe_id)
+        .values_list('user', flat=True)
+    )
+    apply_amounts(user_ids, delta)
+
+
+@contextmanager
+def tracking_recipes(recipe_ids):
+    """
+    Applies whatever the block changes in the ingredients of the given
+    recipes to the carts containing them.
+    """
+    old_amounts = {
+        recipe_id: recipe_amounts(recipe_id)
+        for recipe_id in set(recipe_ids)
+    }
+    yield
+    for recipe_id, amounts in old_amounts.items():
+        recipe_changed(recipe_id, amounts)
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Recomputes the totals from ShoppingCart; returns the row count."""
+    items = ShoppingListItem.objects.all()
+    carts = RecipeIngredient.objects.filter(recipe__shoppinglist__isnull=False)
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+        # not chained onto the filter above: a second filter() would join
+        # the carts again and sum each amount once per cart of the recipe
+        carts = RecipeIngredient.objects.filter(
+            recipe__shoppinglist__user__in=user_ids
+        )
+    items.delete()
+    totals = carts.values(
+        'ingredient',
+        user_id=F('recipe__shoppinglist__user'),
+    ).annotate(
+        total=Sum('amount')
+    ).values_list('user_id', 'ingredient', 'total').order_by()
+    return len(ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=total
+            )
+            for user_id, ingredient_id, total in totals.iterator()
+        ),
+        batch_size=1000,
+    ))
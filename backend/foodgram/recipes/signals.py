@@ -0,0 +1,186 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from users.models import CustomUser
+
+from . import feed, images, pantry, shopping_list
+
+from .cache import (
+    INGREDIENTS_VERSION_KEY,
+    TAGS_VERSION_KEY,
+    bump_recipe_version,
+    bump_recipe_versions,
+    bump_user_version,
+    bump_version,
+)
+from .counters import adjust
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    Tag,
+)
+from .storage import release_image
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe_version(instance.pk)
+    pantry.recipe_changed(instance.pk)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    instance._stored_image = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    stored_image = instance.__dict__.pop('_stored_image', None)
+    if stored_image and stored_image != instance.image.name:
+        release_image(stored_image)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    release_image(instance.image.name)
+    variants = instance.image_variants
+    transaction.on_commit(lambda: images.delete_variants(variants))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_recipe_version(instance.recipe_id)
+    pantry.recipe_changed(instance.recipe_id)
+
+
+# author fields embedded in the recipe payloads
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    # before the delete, which drops the tag's recipe links unsignalled
+    bump_version(TAGS_VERSION_KEY)
+    bump_recipe_versions(Recipe.tags.through.objects.filter(
+        tag=instance.pk
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    # deleted ingredients take their RecipeIngredient rows along, and
+    # those bump their recipes
+    bump_version(INGREDIENTS_VERSION_KEY)
+    if kwargs.get('created') is False:
+        bump_recipe_versions(RecipeIngredient.objects.filter(
+            ingredient=instance.pk
+        ).values_list('recipe_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=CustomUser)
+def author_changed(sender, instance, created, update_fields=None,
+                   **kwargs):
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    bump_recipe_versions(Recipe.objects.filter(
+        author=instance.pk
+    ).values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipe_version(instance.pk)
+        return
+    bump_recipe_version()
+    for recipe_id in pk_set or ():
+        bump_recipe_version(recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Subscription)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        count(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Subscription)
+def count_deleted(sender, instance, **kwargs):
+    count(sender, instance, -1)
+
+
+def count(sender, instance, delta):
+    if sender is Recipe:
+        adjust(CustomUser, instance.author_id, 'recipes_count', delta)
+    elif sender is Favorite:
+        adjust(Recipe, instance.recipe_id, 'favorites_count', delta)
+    else:
+        adjust(CustomUser, instance.follow_id, 'followers_count', delta)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_added(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_removed(sender, instance, **kwargs):
+    # before the delete: a recipe deleted along with its carts still has
+    # its ingredients then
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def user_recipes_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+def followed(sender, instance, created, **kwargs):
+    if created:
+        feed.follow(instance.follower_id, instance.follow)
+
+
+@receiver(post_delete, sender=Subscription)
+def unfollowed(sender, instance, **kwargs):
+    feed.unfollow(instance.follower_id, instance.follow_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    bump_user_version(instance.follower_id)
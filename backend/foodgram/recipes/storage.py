@@ -0,0 +1,76 @@
+"""
+Content-addressed storage for recipe images. A file is stored under the
+SHA-256 of its content, sharded as ab/cd/abcd....ext, so re-posting the
+same picture reuses the stored file. A file is shared by every recipe
+whose image points to it and is deleted when the last of them lets go.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # a release committing before this upload does may delete
+            # the file it reuses; it is written again if so
+            transaction.on_commit(lambda: self.restore(name, content))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def restore(self, name, content):
+        if self.exists(name) or content.closed:
+            return
+        content.seek(0)
+        self._save(name, content)
+
+
+def release_image(name):
+    """
+    Deletes a stored image once the transaction commits, unless some
+    recipe still references it. The references are counted from the
+    recipes themselves, so the count can not drift.
+    """
+    if not name:
+        return
+
+    def release():
+        from .models import Recipe
+
+        if not Recipe.objects.filter(image=name).exists():
+            Recipe._meta.get_field('image').storage.delete(name)
+
+    transaction.on_commit(release)
@@ -0,0 +1,49 @@
+"""
+Trending score: favorites counted with exponential decay, so that a
+favorite loses half its weight every TRENDING_HALF_LIFE seconds.
+
+Each recipe stores its decayed count as of a reference time and a sort
+key, log(count) + reference time / tau. Every count decays by the same
+factor as time passes, so ordering by the key ranks recipes by their
+current decayed count without recomputing anything at read time. A
+favorite added or removed updates one row in constant time, and bumps
+the trending version that cached trending lists are keyed on.
+"""
+import math
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import TRENDING_VERSION_KEY, bump_version
+from .models import Recipe
+
+
+def tau():
+    return settings.TRENDING_HALF_LIFE / math.log(2)
+
+
+def decayed(count, reference, now):
+    if not count or reference is None:
+        return 0.0
+    return count * math.exp(-(now - reference).total_seconds() / tau())
+
+
+def record(recipe_id, delta):
+    """
+    Adds ``delta`` favorites at the current time to the recipe's score.
+    Must run inside the transaction that adds or removes the favorite.
+    """
+    recipe = Recipe.objects.select_for_update().only(
+        'trending_count', 'trending_at'
+    ).get(pk=recipe_id)
+    now = timezone.now()
+    # a removed favorite has decayed since it was added, by how much is
+    # not known; the count is kept from going negative
+    count = max(
+        decayed(recipe.trending_count, recipe.trending_at, now) + delta, 0.0
+    )
+    score = math.log(count) + now.timestamp() / tau() if count else 0.0
+    Recipe.objects.filter(pk=recipe_id).update(
+        trending_count=count, trending_at=now, trending_score=score
+    )
+    bump_version(TRENDING_VERSION_KEY)
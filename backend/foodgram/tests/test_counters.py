@@ -0,0 +1,49 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Favorite, Recipe, Subscription
+from users.models import CustomUser
+
+
+class CounterColumnsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = [
+            CustomUser.objects.create_user(
+                email=f'{name}@example.com',
+                username=name,
+                first_name=name,
+                last_name=name,
+                password='password',
+            )
+            for name in ('author', 'reader')
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='recipe', text='text', cooking_time=10
+        )
+
+    def test_full_save_keeps_concurrent_counter_updates(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = CustomUser.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(follower=self.reader, follow=self.author)
+        recipe.name = 'renamed'
+        recipe.save()
+        author.first_name = 'renamed'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'renamed')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.first_name, 'renamed')
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_reconcile_fixes_drifted_counters(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
@@ -0,0 +1,63 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import FeedEntry, Recipe, Subscription
+from users.models import CustomUser
+
+
+class FollowedFeedTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author = [
+            CustomUser.objects.create_user(
+                email=f'{name}@example.com',
+                username=name,
+                first_name=name,
+                last_name=name,
+                password='password',
+            )
+            for name in ('reader', 'author')
+        ]
+        cls.recipes = [
+            Recipe.objects.create(author=cls.author, name=f'recipe{number}',
+                                  text='text', cooking_time=10)
+            for number in range(3)
+        ]
+
+    def feed_ids(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_orm_subscription_backfills_and_purges_the_feed(self):
+        subscription = Subscription.objects.create(
+            follower=self.reader, follow=self.author
+        )
+        self.assertEqual(
+            self.feed_ids(), {recipe.id for recipe in self.recipes}
+        )
+        subscription.delete()
+        self.assertEqual(self.feed_ids(), set())
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_admin_subscription_backfills_and_purges_the_feed(self):
+        admin = CustomUser.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post('/admin/recipes/subscription/add/', {
+            'follow': self.author.id,
+            'follower': self.reader.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3
+        )
+        response = self.client.post('/admin/recipes/subscription/', {
+            'action': 'delete_selected',
+            '_selected_action': [Subscription.objects.get().id],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(FeedEntry.objects.exists())
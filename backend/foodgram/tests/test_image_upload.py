@@ -0,0 +1,82 @@
+import tracemalloc
+from base64 import b64encode
+
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.fields import StreamingBase64ImageField
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+MIB = 1024 ** 2
+
+
+def data_url(content):
+    return 'data:image/png;base64,' + b64encode(content).decode()
+
+
+class StreamingBase64DecodeTest(SimpleTestCase):
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=16 * MIB)
+    def test_peak_memory_does_not_grow_with_the_image(self):
+        payload = data_url(bytes(range(256)) * (8 * MIB // 256))
+        field = StreamingBase64ImageField()
+        tracemalloc.start()
+        try:
+            decoded = field.decode(payload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        try:
+            self.assertEqual(decoded.size, 8 * MIB)
+        finally:
+            decoded.close()
+        # a few decode chunks, not the 8 MiB image
+        self.assertLess(peak, MIB)
+
+
+class RecipeImageUploadTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            email='cook@example.com',
+            username='cook',
+            first_name='Cook',
+            last_name='Cook',
+            password='password',
+        )
+        cls.tag = Tag.objects.create(name='tag', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def post_recipe(self, image):
+        return self.client.post(
+            '/api/recipes/',
+            {
+                'name': 'recipe',
+                'text': 'text',
+                'cooking_time': 10,
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 100}],
+                'image': image,
+            },
+            format='json',
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_oversized_image_is_refused(self):
+        response = self.post_recipe(data_url(b'\0' * 4096))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_invalid_base64_is_refused(self):
+        response = self.post_recipe('data:image/png;base64,not*base64!')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
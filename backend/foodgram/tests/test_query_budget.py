@@ -0,0 +1,143 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from api.filters import get_tag_ids
+from api.views import RecipeViewSet
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    SimilarRecipe,
+    Subscription,
+    Tag,
+)
+from users.models import CustomUser
+
+# viewer flag lookups put on top of a cached payload
+VIEWER_FLAG_QUERIES = 3
+
+
+class RecipeQueryBudgetTest(APITestCase):
+    """
+    Recipe list and detail run a fixed number of queries whatever the
+    page size, within RecipeViewSet.query_budget on a cache miss and
+    with only the viewer flags on a cache hit. The uncached feed and
+    similar recipes run exactly their budget.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Reader',
+            last_name='Reader',
+            password='password',
+        )
+        authors = [
+            CustomUser.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Author',
+                last_name='Author',
+                password='password',
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'tag{number}', color='#000000',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=authors[number % 3],
+                name=f'recipe{number}',
+                text='text',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:1 + number % 3])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=100)
+                for ingredient in ingredients[:2 + number % 3]
+            ])
+        cls.recipe = recipe
+        for author in authors:
+            Subscription.objects.create(follower=cls.user, follow=author)
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(recipe=recipe, similar=other, score=1 / other.id)
+            for other in Recipe.objects.exclude(id=recipe.id)
+        ])
+
+    def assert_queries(self, url, budget, authenticated):
+        cache.clear()
+        # resolved once per tag change, not per request
+        get_tag_ids()
+        self.client.force_authenticate(self.user if authenticated else None)
+        if authenticated:
+            hit = VIEWER_FLAG_QUERIES
+        else:
+            budget -= VIEWER_FLAG_QUERIES
+            hit = 0
+        with self.subTest(url=url, authenticated=authenticated, cache='miss'):
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        with self.subTest(url=url, authenticated=authenticated, cache='hit'):
+            with self.assertNumQueries(hit):
+                cached = self.client.get(url)
+            self.assertEqual(cached.status_code, 200)
+            self.assertEqual(cached.data, response.data)
+        return response
+
+    def test_list(self):
+        for limit in (2, 10):
+            for authenticated in (False, True):
+                response = self.assert_queries(
+                    f'/api/recipes/?limit={limit}',
+                    RecipeViewSet.query_budget['list'],
+                    authenticated,
+                )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve(self):
+        for authenticated in (False, True):
+            self.assert_queries(
+                f'/api/recipes/{self.recipe.id}/',
+                RecipeViewSet.query_budget['retrieve'],
+                authenticated,
+            )
+
+    def test_followed_feed(self):
+        self.client.force_authenticate(self.user)
+        for limit in (2, 10):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(
+                    RecipeViewSet.query_budget['followed_feed']
+                ):
+                    response = self.client.get(
+                        f'/api/recipes/feed/?limit={limit}'
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_similar(self):
+        for authenticated in (False, True):
+            self.client.force_authenticate(
+                self.user if authenticated else None
+            )
+            with self.subTest(authenticated=authenticated):
+                with self.assertNumQueries(
+                    RecipeViewSet.query_budget['similar']
+                ):
+                    response = self.client.get(
+                        f'/api/recipes/{self.recipe.id}/similar/'
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data), 11)
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import CustomUser
+
+
+class ShoppingListTotalsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='User',
+                last_name='User',
+                password='password',
+            )
+            for number in range(3)
+        ]
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.users[0], name='recipe', text='text', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=10
+        )
+
+    def totals(self):
+        return dict(ShoppingListItem.objects.values_list('user', 'amount'))
+
+    def test_orm_cart_writes_update_totals(self):
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+        self.assertEqual(
+            self.totals(), {user.id: 10 for user in self.users}
+        )
+        ShoppingCart.objects.filter(user=self.users[0]).delete()
+        self.assertEqual(
+            self.totals(), {user.id: 10 for user in self.users[1:]}
+        )
+
+    def test_admin_bulk_delete_updates_totals(self):
+        carts = [
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+            for user in self.users
+        ]
+        admin = CustomUser.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected',
+            '_selected_action': [cart.id for cart in carts[:2]],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.totals(), {self.users[2].id: 10})
+
+    def test_deleting_a_recipe_empties_its_carts_totals(self):
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+        self.recipe.delete()
+        self.assertEqual(self.totals(), {})
+
+    def test_rebuild_one_user_of_a_shared_recipe(self):
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+        ShoppingListItem.objects.all().delete()
+        call_command('rebuild_shopping_lists', users=[self.users[1].id],
+                     stdout=StringIO())
+        self.assertEqual(self.totals(), {self.users[1].id: 10})
@@ -9,9 +9,18 @@ class CustomUserAdmin(UserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
     model = CustomUser
-    list_display = ('email', 'is_staff', 'is_active', 'first_name', 'last_name')
+    list_display = (
+        'email',
+        'is_staff',
+        'is_active',
+        'first_name',
+        'last_name',
+        'recipes_count',
+        'followers_count',
+    )
     search_fields = ('first_name', 'email')
-    list_filter = ('email', 'is_staff', 'is_active',)
+    list_filter = ('is_staff', 'is_active',)
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Permissions', {'fields': ('is_staff', 'is_active')}),
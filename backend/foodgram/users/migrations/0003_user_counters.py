@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(model, lookup):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{lookup: OuterRef('pk')}
+            ).order_by().values(lookup).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0,
+    )
+
+
+def count_recipes_and_followers(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    CustomUser.objects.update(
+        recipes_count=count_rows(Recipe, 'author'),
+        followers_count=count_rows(Subscription, 'follow'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_customuser_options'),
+        ('recipes', '0009_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-followers_count', 'id'], name='user_followers_count_idx'),
+        ),
+        migrations.RunPython(
+            count_recipes_and_followers, migrations.RunPython.noop
+        ),
+    ]
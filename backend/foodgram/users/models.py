@@ -5,19 +5,61 @@ from django.utils.translation import gettext_lazy as _
 from .managers import CustomUserManager
 
 
-class CustomUser(AbstractUser):
+class ConcurrentFieldsMixin:
+    """
+    Leaves the columns listed in ``concurrent_fields`` out of a full
+    save() of an existing row. They are only written with UPDATE ...
+    F() and similar queries, which an instance read before them would
+    otherwise overwrite with its stale values.
+    """
+    concurrent_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not (
+            args
+            or self._state.adding
+            or kwargs.get('force_insert')
+            or kwargs.get('update_fields') is not None
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.concurrent_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(ConcurrentFieldsMixin, AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     first_name = models.CharField(max_length=150, verbose_name='Имя')
     last_name = models.CharField(max_length=150, verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
     objects = CustomUserManager()
 
+    concurrent_fields = ('recipes_count', 'followers_count')
+
     class Meta:
         ordering = ['pk']
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(
+                fields=['-followers_count', 'id'],
+                name='user_followers_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.email
@@ -22,7 +22,11 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         current_user = self.context.get('request').user
+        if current_user.is_anonymous:
+            return False
         current_recipe_author = obj
         is_subscribed = Subscription.objects.filter(
             follow=current_recipe_author,
@@ -1,3 +1,13 @@
+from django.db.models import (
+    F,
+    Prefetch,
+    Value,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status
@@ -8,18 +18,66 @@ from rest_framework.pagination import PageNumberPagination
 
 from .serializers import UserSerializer, MeUserSerializer
 from .models import CustomUser
-from recipes.models import Subscription
+from recipes.models import Recipe, Subscription
 from api.serializers import (
     SubscribeUserSerializer,
     SubscribeSerializer,
 )
 
 
+def recent_recipes(author_ids, limit=None):
+    """
+    Recipes of the given authors, newest first. With ``limit`` only the
+    newest ``limit`` recipes of each author are fetched: they are ranked
+    per author with ROW_NUMBER() in a subquery, in a single query.
+    """
+    if not author_ids:
+        # an empty IN () can not be compiled into the raw subquery
+        return Recipe.objects.none()
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        ranked = recipes.annotate(position=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).order_by().values('id', 'position')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.position <= %s',
+            (*params, limit),
+        ))
+    return recipes.only(
+        'id', 'author_id', 'name', 'image', 'image_variants', 'cooking_time'
+    ).order_by('-pub_date', '-id')
+
+
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     pagination_class = PageNumberPagination
 
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(limit, 0)
+
+    def with_recipes(self, authors):
+        """
+        Attaches the recipes shown for each followed author: two queries
+        for any number of authors.
+        """
+        authors = list(authors)
+        recipes = recent_recipes(
+            [author.id for author in authors], self.get_recipes_limit()
+        )
+        prefetch_related_objects(
+            authors, Prefetch('recipe_user', queryset=recipes)
+        )
+        return authors
+
     @action(
         methods=["POST", "DELETE"],
         url_path='subscribe',
@@ -50,8 +108,16 @@ class CustomUserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             serializer.is_valid(raise_exception=True)
-            serializer.save(follow=follow, follower=follower)
-            serializer = SubscribeUserSerializer(follow)
+            # the feed is backfilled by recipes.signals
+            with transaction.atomic():
+                serializer.save(follow=follow, follower=follower)
+            follow = CustomUser.objects.annotate(
+                is_subscribed=Value(True),
+            ).get(id=follow.id)
+            serializer = SubscribeUserSerializer(
+                self.with_recipes([follow])[0],
+                context={'request': request},
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if not Subscription.objects.filter(
@@ -82,14 +148,20 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         detail=False
     )
     def subscribe_list(self, request):
-        follow = CustomUser.objects.filter(follow_user__follower=request.user)
+        follow = CustomUser.objects.filter(
+            id__in=Subscription.objects.filter(
+                follower=request.user
+            ).values('follow_id')
+        ).annotate(
+            is_subscribed=Value(True),
+        ).order_by('id')
         paginator = PageNumberPagination()
         paginator.page_size = 6
         result_page = paginator.paginate_queryset(follow, request)
         serializer = SubscribeUserSerializer(
-            result_page,
+            self.with_recipes(result_page),
             many=True,
-            context={'current_user': request.user}
+            context={'request': request}
         )
         return paginator.get_paginated_response(serializer.data)
 